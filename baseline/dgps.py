@@ -2,14 +2,17 @@
 dgps.py
 -----------------
 Data-generating functions for BH (1995) FDR simulation.
-normal means with varying signal strengths.
+normal means with varying signal strengths, observed either
+directly as z-scores or through raw samples and t-tests.
 
 Author: Dili K. Maduabum
 Last edit: October 21, 2025
 """
 
 import numpy as np
-import pandas as pd
+
+# Raw observations generated per block by generate_pvalues_ttest
+CHUNK_ELEMENTS = 1 << 20
 
 def generate_pvalues(m=100, pi0=0.8, effect_size=1.0, seed=None):
     """
@@ -18,16 +21,18 @@ def generate_pvalues(m=100, pi0=0.8, effect_size=1.0, seed=None):
     Under null: X ~ N(0, 1)
     Under alternative: X ~ N(effect_size, 1)
     Convert to two-sided z-test p-values.
+
+    `seed` may be an int or a SeedSequence; each call draws from
+    its own counter-based (Philox) Generator.
     """
-    if seed is not None:
-        np.random.seed(seed)
+    rng = np.random.Generator(np.random.Philox(seed))
     
     m0 = int(m * pi0)
     m1 = m - m0
     
     # Generate observations
-    null_obs = np.random.normal(0, 1, m0)
-    alt_obs = np.random.normal(effect_size, 1, m1)
+    null_obs = rng.normal(0, 1, m0)
+    alt_obs = rng.normal(effect_size, 1, m1)
     
     # Convert to p-values (two-sided z-test)
     from scipy.stats import norm
@@ -39,10 +44,65 @@ def generate_pvalues(m=100, pi0=0.8, effect_size=1.0, seed=None):
     is_null = np.array([True] * m0 + [False] * m1)
     
     # Shuffle
-    idx = np.random.permutation(m)
-    
+    idx = rng.permutation(m)
+
+    # Imported here so that importing the baseline stays cheap
+    import pandas as pd
+
     return pd.DataFrame({
         "p_value": p_values[idx],
         "is_null": is_null[idx]
     })
 
+
+def generate_pvalues_ttest(m=100, pi0=0.8, effect_size=1.0, n=20,
+                           test="welch", sd_ratio=1.0, seed=None):
+    """
+    Generate p-values from two-sample t-tests on raw data.
+
+    Each test compares n observations of group A ~ N(0, 1) with
+    n observations of group B:
+    Under null: B ~ N(0, sd_ratio^2)
+    Under alternative: B ~ N(effect_size, sd_ratio^2)
+
+    `test` is "welch" (unequal variances) or "student" (pooled).
+
+    The raw data are generated block by block, whole rows of
+    (A, B) at a time, so at most about CHUNK_ELEMENTS values are
+    held in memory.
+    """
+    from scipy.stats import ttest_ind
+
+    if test not in ("welch", "student"):
+        raise ValueError(f"test must be 'welch' or 'student', got {test!r}")
+    if n < 2:
+        raise ValueError(f"need n >= 2 observations per group, got {n}")
+
+    rng = np.random.Generator(np.random.Philox(seed))
+
+    m0 = int(m * pi0)
+    m1 = m - m0
+    means = np.array([0.0] * m0 + [effect_size] * m1)
+    rows = max(1, CHUNK_ELEMENTS // (2 * n))
+
+    p_values = []
+    for start in range(0, m, rows):
+        block = rng.standard_normal((min(rows, m - start), 2 * n))
+        group_a = block[:, :n]
+        group_b = means[start:start + len(block), None] + sd_ratio * block[:, n:]
+        result = ttest_ind(group_b, group_a, axis=1,
+                           equal_var=(test == "student"))
+        p_values.append(result.pvalue)
+
+    p_values = np.concatenate(p_values)
+    is_null = np.array([True] * m0 + [False] * m1)
+
+    # Shuffle
+    idx = rng.permutation(m)
+
+    import pandas as pd
+
+    return pd.DataFrame({
+        "p_value": p_values[idx],
+        "is_null": is_null[idx]
+    })
@@ -10,7 +10,7 @@ Last Edited: October 21, 2025
 
 import numpy as np
 
-def bh_procedure(p_values, alpha=0.05):
+def bh_procedure(p_values, alpha=0.05, approx=False, return_bounds=False):
     """
     Apply the Benjamini–Hochberg (BH) FDR procedure.
 
@@ -20,13 +20,30 @@ def bh_procedure(p_values, alpha=0.05):
         List or numpy array of p-values.
     alpha : float
         Desired false discovery rate (default = 0.05).
+    approx : bool
+        Skip the sort and reject p <= the cutoff of a one-pass
+        p-value sketch (see optimized/sketch.py); every such
+        rejection is also a BH rejection.
+    return_bounds : bool
+        With approx, also return the sketch's bounds
+        {"R_lo", "R_hi", "cutoff"}; R_lo <= R <= R_hi for the
+        exact BH rejection count R.
 
     Returns
     -------
     rejects : numpy array of bool
         True if hypothesis is rejected, False otherwise.
+        (rejects, bounds) when approx and return_bounds are set.
     """
     p_values = np.asarray(p_values)
+
+    if approx:
+        from optimized.sketch import PValueSketch
+
+        bounds = PValueSketch.from_pvalues(p_values).bh_bounds(alpha)
+        rejects = p_values <= bounds["cutoff"]
+        return (rejects, bounds) if return_bounds else rejects
+
     m = len(p_values)
     sorted_idx = np.argsort(p_values)
     sorted_p = p_values[sorted_idx]
@@ -68,6 +85,147 @@ def uncorrected_method(p_values, alpha=0.05):
     return rejects
 
 
+# ------------------------
+# Local false discovery rate
+# ------------------------
+
+LFDR_BINS = 512     # Most histogram bins for the z-score density
+LFDR_BINS_PER_SD = 5  # Bins per kernel standard deviation
+LFDR_ZMAX = 8.0     # z-scores are clipped to [-LFDR_ZMAX, LFDR_ZMAX]
+LFDR_CENTER = 1.0   # pi0 is matched on |z| <= LFDR_CENTER
+
+
+def local_fdr_method(p_values, alpha=0.05, n_bins=None,
+                     bandwidth=None, null="theoretical"):
+    """
+    Empirical-Bayes local false discovery rate (Efron, 2004).
+
+    Each p-value is mapped to z = Phi^-1(1 - p), which is exactly
+    N(0, 1) under the null. The mixture density f of the z-scores
+    is estimated on a histogram: the bin counts are smoothed with a
+    Gaussian kernel. By default the bins are LFDR_BINS_PER_SD to a
+    kernel standard deviation, so the grid grows with m only as
+    the bandwidth shrinks (about m^(1/5), up to LFDR_BINS bins)
+    and the kernel has a fixed length; the cost is O(m log m) for
+    the bandwidth's quartiles plus O(n_bins), rather than the
+    O(m^2) of a direct kernel density. Then
+
+        lfdr(z) = pi0 f0(z) / f(z),
+
+    forced to be non-increasing in z on the signal side z > 0 and
+    taken as 1 for z <= 0, so no p-value above 0.5 is ever rejected.
+    The bins with the smallest lfdr are rejected for as long as the
+    mean lfdr of everything rejected stays <= alpha (an estimate of
+    the FDR of the rejection set).
+
+    Parameters
+    ----------
+    p_values : array-like
+        List or numpy array of p-values.
+    alpha : float
+        Target mean local fdr of the rejections (default = 0.05).
+    n_bins : int or None
+        Histogram bins on [-LFDR_ZMAX, LFDR_ZMAX]; None picks
+        LFDR_BINS_PER_SD bins per bandwidth (LFDR_BINS / 8 to
+        LFDR_BINS).
+    bandwidth : float or None
+        Kernel standard deviation; None uses Silverman's rule.
+    null : {"theoretical", "empirical"}
+        f0 = N(0, 1) with pi0 from the count of |z| <= LFDR_CENTER,
+        or Efron's central matching: a quadratic fit to log f over
+        the central half of the z-scores gives an N(mu0, sigma0^2)
+        null and pi0 together.
+
+    Returns
+    -------
+    rejects : numpy array of bool
+        True if hypothesis is rejected, False otherwise.
+    """
+    # scipy.special rather than scipy.stats.norm: this runs once per
+    # replicate at small m, where norm's call overhead dominates
+    from scipy.special import ndtr, ndtri
+
+    def normal_pdf(x, mu=0.0, sigma=1.0):
+        u = (x - mu) / sigma
+        return np.exp(-0.5 * u * u) / (np.sqrt(2 * np.pi) * sigma)
+
+    p_values = np.asarray(p_values, dtype=float)
+    m = len(p_values)
+    if m == 0:
+        return np.zeros(0, dtype=bool)
+
+    # z = Phi^-1(1 - p), computed as -Phi^-1(p) to keep small p exact
+    z = np.clip(-ndtri(p_values), -LFDR_ZMAX, LFDR_ZMAX)
+
+    if bandwidth is None:
+        q75, q25 = np.percentile(z, [75, 25])
+        spread = min(np.std(z), (q75 - q25) / 1.349) or 1.0
+        bandwidth = 0.9 * spread * m ** (-1 / 5)
+    if n_bins is None:
+        # Between LFDR_BINS / 8 and LFDR_BINS bins
+        wanted = (2 * LFDR_ZMAX * LFDR_BINS_PER_SD / bandwidth
+                  if bandwidth > 0 else LFDR_BINS)
+        n_bins = int(np.clip(np.ceil(wanted), LFDR_BINS // 8, LFDR_BINS))
+
+    # Bin the z-scores: O(m)
+    width = 2 * LFDR_ZMAX / n_bins
+    bins = np.minimum(((z + LFDR_ZMAX) / width).astype(int), n_bins - 1)
+    counts = np.bincount(bins, minlength=n_bins).astype(float)
+    centers = -LFDR_ZMAX + (np.arange(n_bins) + 0.5) * width
+
+    # Smooth with a Gaussian kernel spanning +/- 5 bandwidths
+    bandwidth = max(bandwidth, width)
+    half = min(n_bins, int(np.ceil(5 * bandwidth / width)))
+    kernel = normal_pdf(np.arange(-half, half + 1) * width / bandwidth)
+    kernel /= kernel.sum()
+    density = np.convolve(counts, kernel)[half:half + n_bins]
+    density = np.maximum(density, 1e-12) / (m * width)
+
+    # Null density f0 and proportion of nulls pi0
+    if null == "theoretical":
+        f0 = normal_pdf(centers)
+        central = np.abs(z) <= LFDR_CENTER
+        pi0 = central.mean() / (2 * ndtr(LFDR_CENTER) - 1)
+    elif null == "empirical":
+        lo, hi = np.percentile(z, [25, 75])
+        fit = (centers >= lo) & (centers <= hi) & (counts > 0)
+        c2, c1, c0 = np.polyfit(centers[fit], np.log(density[fit]), 2,
+                                w=np.sqrt(counts[fit]))
+        if c2 >= 0:
+            raise ValueError("central matching failed: log density "
+                             "is not concave near 0")
+        sigma0 = np.sqrt(-1 / (2 * c2))
+        mu0 = c1 * sigma0 ** 2
+        f0 = normal_pdf(centers, mu0, sigma0)
+        pi0 = np.exp(c0 + mu0 ** 2 / (2 * sigma0 ** 2)) * \
+            np.sqrt(2 * np.pi) * sigma0
+    else:
+        raise ValueError(f"null must be 'theoretical' or 'empirical', "
+                         f"got {null!r}")
+    pi0 = min(pi0, 1.0)
+
+    lfdr = np.minimum(pi0 * f0 / density, 1.0)
+
+    # Signal only shows up as large z (small p). In the far left tail
+    # the smoothed density is much heavier than f0, so the raw ratio
+    # drops towards 0 there; those bins (p > 0.5) are never rejected,
+    # and on the right lfdr is made non-increasing in z.
+    signal = centers > 0
+    lfdr[~signal] = 1.0
+    lfdr[signal] = np.minimum.accumulate(lfdr[signal])
+
+    # Reject bins in order of lfdr while the mean lfdr stays <= alpha
+    order = np.argsort(lfdr, kind="stable")
+    rejected_lfdr = np.cumsum(counts[order] * lfdr[order])
+    rejected = np.cumsum(counts[order])
+    ok = rejected_lfdr <= alpha * np.maximum(rejected, 1)
+    n_ok = int(np.argmin(ok)) if not ok.all() else n_bins
+
+    reject_bin = np.zeros(n_bins, dtype=bool)
+    reject_bin[order[:n_ok]] = True
+    return reject_bin[bins]
+
+
 if __name__ == "__main__":
     # Simple test run to verify methods
     test_p = np.array([0.001, 0.02, 0.04, 0.06, 0.2, 0.9])
@@ -81,3 +239,6 @@ if __name__ == "__main__":
     
     print("\nUncorrected:")
     print(uncorrected_method(test_p, alpha=0.05))
+
+    print("\nLocal fdr:")
+    print(local_fdr_method(test_p, alpha=0.05))
@@ -8,12 +8,46 @@ Metrics include:
 - False Discovery Rate (FDR)
 - Power
 
+Simulation drivers store the integer counts behind these
+ratios (V, R, S, m1) for every replicate and method; the
+ratios, and pooled versions such as E[V] / E[R], are derived
+from the counts when results are loaded.
+
 Author: Dili K. Maduabum
 Lasted Edited: October 21, 2025
 """
 
+import os
+
 import numpy as np
-import pandas as pd
+
+# Per-replicate counts stored by the drivers (V false rejections,
+# R rejections, S true rejections, m1 non-nulls) and their compact
+# type. This is the one definition; optimized/kernels.py imports
+# it (and only keeps a copy for standalone script runs).
+COUNT_COLUMNS = ("V", "R", "S", "m1")
+COUNT_DTYPE = "uint32"
+
+# Sketch bounds R_lo <= R_exact <= R_hi on the BH count, stored
+# alongside the counts when BH is approximated
+BOUND_COLUMNS = ("R_lo", "R_hi")
+
+
+def read_counts_csv(path):
+    """
+    Read a results CSV with the count (and any bound) columns as
+    COUNT_DTYPE and floats round-tripped exactly. An empty file
+    (a shard with nothing to do) gives an empty DataFrame.
+    """
+    import pandas as pd
+
+    if os.path.getsize(path) == 0:
+        return pd.DataFrame()
+    header = pd.read_csv(path, nrows=0).columns
+    dtypes = {c: COUNT_DTYPE for c in COUNT_COLUMNS + BOUND_COLUMNS
+              if c in header}
+    return pd.read_csv(path, float_precision="round_trip", dtype=dtypes)
+
 
 def compute_fdr(rejects, is_null):
     """
@@ -75,3 +109,80 @@ def compute_power(rejects, is_null):
         return true_positives / total_false_nulls
 
 
+# ------------------------
+# Integer counts
+# ------------------------
+
+def compute_counts(rejects, is_null):
+    """
+    Integer counts behind FDR and power.
+
+    Returns
+    -------
+    dict
+        V (rejected nulls), R (rejections), S (rejected
+        non-nulls) and m1 (non-nulls), as Python ints.
+    """
+    rejects = np.asarray(rejects)
+    is_null = np.asarray(is_null)
+
+    return {
+        "V": int(np.sum(rejects & is_null)),
+        "R": int(np.sum(rejects)),
+        "S": int(np.sum(rejects & ~is_null)),
+        "m1": int(np.sum(~is_null)),
+    }
+
+
+def fdr_from_counts(V, R):
+    """
+    Per-replicate false discovery proportion V / R (0 when R = 0).
+    Works elementwise on arrays and Series.
+    """
+    V = np.asarray(V, dtype=float)
+    R = np.asarray(R, dtype=float)
+    return np.where(R > 0, V / np.maximum(R, 1), 0.0)
+
+
+def power_from_counts(S, m1):
+    """
+    Per-replicate power S / m1 (0 when m1 = 0).
+    """
+    S = np.asarray(S, dtype=float)
+    m1 = np.asarray(m1, dtype=float)
+    return np.where(m1 > 0, S / np.maximum(m1, 1), 0.0)
+
+
+def with_metrics(df):
+    """
+    Add FDR and Power columns derived from the counts.
+
+    Frames without count columns (results written before counts
+    were stored) are returned unchanged.
+    """
+    if not set(COUNT_COLUMNS) <= set(df.columns):
+        return df
+    df = df.copy()
+    df["FDR"] = fdr_from_counts(df["V"], df["R"])
+    df["Power"] = power_from_counts(df["S"], df["m1"])
+    return df
+
+
+def load_results(path):
+    """
+    Read a results CSV with compact integer counts and derived
+    FDR and Power columns.
+    """
+    return with_metrics(read_counts_csv(path))
+
+
+def pooled_metrics(df, by):
+    """
+    Ratio-of-sums metrics per group, which per-replicate ratios
+    cannot give: E[V] / E[R] (the marginal FDR) and pooled power
+    sum(S) / sum(m1).
+    """
+    sums = df.groupby(by)[list(COUNT_COLUMNS)].sum()
+    sums["mFDR"] = fdr_from_counts(sums["V"], sums["R"])
+    sums["Power_pooled"] = power_from_counts(sums["S"], sums["m1"])
+    return sums[["mFDR", "Power_pooled"]].reset_index()
@@ -7,8 +7,9 @@ False Discovery Rate (FDR) reproduction study.
 This script:
 - Generates simulated p-values under different parameter settings
 - Applies multiple-testing correction methods
-- Computes FDR and Power for each method
-- Saves raw results to CSV for later analysis and visualization
+- Counts rejections (V, R, S, m1) for each method
+- Saves raw results to CSV for later analysis and visualization;
+  FDR and Power are derived from the counts on load
 
 Author: Dili K. Maduabum
 Last Edited: October 21, 2025
@@ -16,13 +17,13 @@ Last Edited: October 21, 2025
 
 import os
 import itertools
-import pandas as pd
 import numpy as np
-from tqdm import tqdm
 
-from baseline.dgps import generate_pvalues
-from baseline.methods import bh_procedure, bonferroni_method, uncorrected_method
-from baseline.metrics import compute_fdr, compute_power
+from baseline.dgps import generate_pvalues, generate_pvalues_ttest
+from baseline.methods import (
+    bh_procedure, bonferroni_method, local_fdr_method, uncorrected_method
+)
+from baseline.metrics import compute_counts, read_counts_csv
 
 # ------------------------
 # Simulation configuration
@@ -37,11 +38,9 @@ pi0_values = [0.75, 0.50, 0.25]      # Proportion of true nulls
 effect_sizes = [0.5, 1.0, 1.5]       # Small, Medium, Large signals
 alpha_levels = [0.05]                # Nominal FDR level
 
-# Ensure output directory exists
-os.makedirs("results/raw", exist_ok=True)
 
-
-def run_single_simulation(m, pi0, effect_size, alpha, seed):
+def run_single_simulation(m, pi0, effect_size, alpha, seed, n_obs=None,
+                          test="welch"):
     """
     Run one replicate of the simulation for a single combination of parameters.
 
@@ -55,16 +54,26 @@ def run_single_simulation(m, pi0, effect_size, alpha, seed):
         Mean of alternative distribution (Normal(effect_size, 1)).
     alpha : float
         Nominal FDR level.
-    seed : int
+    seed : int or SeedSequence
         Random seed to ensure reproducibility.
+    n_obs : int or None
+        If given, p-values come from two-sample t-tests on raw data
+        with n_obs observations per group; otherwise from z-scores.
+    test : str
+        "welch" or "student", used when n_obs is given.
 
     Returns
     -------
     dict
-        Dictionary of FDR and Power for each method.
+        Dictionary of rejection counts (V, R, S, m1) for each
+        method; see baseline.metrics for FDR and Power.
     """
     # Generate p-values for this replicate
-    data = generate_pvalues(m=m, pi0=pi0, effect_size=effect_size, seed=seed)
+    if n_obs is None:
+        data = generate_pvalues(m=m, pi0=pi0, effect_size=effect_size, seed=seed)
+    else:
+        data = generate_pvalues_ttest(m=m, pi0=pi0, effect_size=effect_size,
+                                      n=n_obs, test=test, seed=seed)
     pvals = data["p_value"].values
     is_null = data["is_null"].values
 
@@ -75,63 +84,80 @@ def run_single_simulation(m, pi0, effect_size, alpha, seed):
     methods = {
         "BH": bh_procedure,
         "Bonferroni": bonferroni_method,
-        "Uncorrected": uncorrected_method
+        "Uncorrected": uncorrected_method,
+        "Local fdr": local_fdr_method
     }
 
-    # Apply each method and compute FDR + Power
+    # Apply each method and count its rejections
     for name, method in methods.items():
         rejects = method(pvals, alpha=alpha)
-        fdr = compute_fdr(rejects, is_null)
-        power = compute_power(rejects, is_null)
-        results[name] = {"FDR": fdr, "Power": power}
+        results[name] = compute_counts(rejects, is_null)
 
     return results
 
 
-def run_simulation():
+def run_simulation(n_obs=None, test="welch"):
     """
     Run the full simulation across all design conditions.
 
+    Replicates are simulated in batches (see optimized/pipeline.py)
+    and each finished batch is appended to the CSV on a writer
+    thread while the next one runs, so the full record list is
+    never held in memory.
+
+    Parameters
+    ----------
+    n_obs, test
+        Passed to run_single_simulation (raw-data t-test DGP).
+
     Returns
     -------
     DataFrame
         Complete set of simulation results.
     """
+    # Output-only dependencies: imported here so that importing
+    # this module (e.g. for run_single_simulation) stays cheap
+    from tqdm import tqdm
+    from optimized.pipeline import BATCH_SIZE, iter_tasks, run_pipeline
+
     print("Running simulation study...")
-    results = []
 
     # Create all combinations of design parameters
     design_grid = list(itertools.product(m_values, pi0_values, effect_sizes, alpha_levels))
-
-    # Outer loop: iterate over each condition
-    for (m, pi0, effect_size, alpha) in tqdm(design_grid, desc="Conditions"):
-        # Inner loop: replicate each condition N_REPS times
-        for r in range(N_REPS):
-            seed = SEED + r  # vary seed by replication
-            sim_results = run_single_simulation(m, pi0, effect_size, alpha, seed)
-
-            # Store each method's results
-            for method, metrics in sim_results.items():
-                results.append({
-                    "method": method,
-                    "m": m,
-                    "pi0": pi0,
-                    "effect_size": effect_size,
-                    "alpha": alpha,
-                    "rep": r,
-                    "FDR": metrics["FDR"],
-                    "Power": metrics["Power"]
-                })
-
-    # Convert list of dictionaries to DataFrame
-    df_results = pd.DataFrame(results)
-
-    # Save raw simulation output to disk
+    n_batches = len(design_grid) * -(-N_REPS // BATCH_SIZE)
+
+    def batches():
+        # Outer loop: batches of replications, condition by condition
+        for c, (m, pi0, effect_size, alpha), reps in tqdm(
+                iter_tasks(design_grid, N_REPS), total=n_batches,
+                desc="Batches"):
+            records = []
+            for r in reps:
+                r = int(r)
+                # Independent stream per (condition, replication)
+                seed = np.random.SeedSequence(SEED, spawn_key=(c, r))
+                sim_results = run_single_simulation(m, pi0, effect_size, alpha,
+                                                    seed, n_obs, test)
+
+                # Store each method's results
+                for method, counts in sim_results.items():
+                    records.append({
+                        "method": method,
+                        "m": m,
+                        "pi0": pi0,
+                        "effect_size": effect_size,
+                        "alpha": alpha,
+                        "rep": r,
+                        **counts
+                    })
+            yield records
+
+    # Save raw simulation output to disk, batch by batch
     out_path = os.path.join("results", "raw", "simulation_results.csv")
-    df_results.to_csv(out_path, index=False)
+    run_pipeline(batches(), out_path)
     print(f"Simulation complete. Results saved to {out_path}")
 
-    return df_results
+    return read_counts_csv(out_path)
 
 
 if __name__ == "__main__":
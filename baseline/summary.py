@@ -0,0 +1,137 @@
+"""
+summary.py
+-----------------
+Summary statistics with bootstrap confidence intervals
+for the Benjamini & Hochberg (1995) FDR simulation study.
+
+All groups (method x condition) are resampled at once:
+rows are sorted by an integer group code, every
+bootstrap draw picks a row inside its own group by
+offset + floor(U * group size), and since every group
+is a contiguous block of columns the resampled group
+sums are one segmented np.add.reduceat per chunk.
+Resamples are processed in chunks so memory stays
+bounded for any B.
+
+Author: Dili K. Maduabum
+Last Edited: November 2025
+"""
+
+import numpy as np
+
+
+GROUP_COLS = ["method", "m", "pi0", "effect_size", "alpha"]
+VALUE_COLS = ["FDR", "Power"]
+
+N_BOOT = 2000          # Bootstrap resamples
+CI_LEVEL = 0.95        # Two-sided percentile interval
+MAX_DRAWS = 2_000_000  # Row draws held in memory per chunk
+
+
+def bootstrap_group_means(values, codes, n_boot=N_BOOT, seed=0):
+    """
+    Bootstrap distribution of every group mean.
+
+    Parameters
+    ----------
+    values : np.ndarray, shape (n,) or (n, k)
+        Observations; the k columns are resampled jointly.
+    codes : np.ndarray of int, shape (n,)
+        Group code of each row; every code in 0..G-1 must occur.
+    n_boot : int
+        Number of bootstrap resamples B.
+    seed : int
+        Seed of the resampling stream.
+
+    Returns
+    -------
+    np.ndarray, shape (B, G, k)
+        Mean of each group in each resample.
+    """
+    values = np.asarray(values, dtype=float)
+    if values.ndim == 1:
+        values = values[:, None]
+    codes = np.asarray(codes)
+
+    n, k = values.shape
+    n_groups = int(codes.max()) + 1 if n else 0
+
+    # Sort rows by group so group g occupies [offset[g], offset[g] + size[g])
+    order = np.argsort(codes, kind="stable")
+    columns = np.ascontiguousarray(values[order].T)
+    row_group = codes[order]
+    sizes = np.bincount(row_group, minlength=n_groups)
+    offsets = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+
+    row_offset = offsets[row_group]
+    row_size = sizes[row_group].astype(float)
+
+    rng = np.random.default_rng(seed)
+    means = np.empty((n_boot, n_groups, k))
+    chunk = max(1, MAX_DRAWS // max(n, 1))
+
+    for lo in range(0, n_boot, chunk):
+        b = min(chunk, n_boot - lo)
+
+        # Each draw stays in the group of the row it replaces,
+        # so every group keeps its size in every resample
+        u = rng.random((b, n))
+        u *= row_size
+        idx = row_offset + u.astype(np.intp)
+
+        # Segmented sum over each group's block of columns
+        for j in range(k):
+            sums = np.add.reduceat(columns[j].take(idx), offsets, axis=1)
+            means[lo:lo + b, :, j] = sums / sizes
+
+    return means
+
+
+def summarize(df, group_cols=GROUP_COLS, value_cols=VALUE_COLS,
+              n_boot=N_BOOT, level=CI_LEVEL, seed=0):
+    """
+    Mean, sd and bootstrap percentile CI of each value column
+    per group.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        Raw replicate-level results.
+    group_cols : list of str
+        Columns defining a group.
+    value_cols : list of str
+        Columns to summarize.
+    n_boot : int
+        Bootstrap resamples.
+    level : float
+        Coverage of the two-sided percentile interval.
+
+    Returns
+    -------
+    pd.DataFrame
+        One row per group with <value>_mean, <value>_sd,
+        <value>_ci_lo and <value>_ci_hi.
+    """
+    grouped = df.groupby(group_cols)
+    summary = grouped.agg(**{
+        f"{col}_{stat}": (col, stat)
+        for col in value_cols for stat in ("mean", "std")
+    }).reset_index()
+    summary = summary.rename(columns={f"{col}_std": f"{col}_sd"
+                                      for col in value_cols})
+
+    # ngroup() numbers groups in the same (sorted) order as agg()
+    codes = grouped.ngroup().to_numpy()
+    boot = bootstrap_group_means(df[value_cols].to_numpy(), codes,
+                                 n_boot, seed)
+
+    tail = (1 - level) / 2
+    lo, hi = np.quantile(boot, [tail, 1 - tail], axis=0)
+    for j, col in enumerate(value_cols):
+        summary[f"{col}_ci_lo"] = lo[:, j]
+        summary[f"{col}_ci_hi"] = hi[:, j]
+
+    # Keep each value's columns together
+    ordered = group_cols + [f"{col}_{stat}" for col in value_cols
+                            for stat in ("mean", "sd", "ci_lo", "ci_hi")]
+    return summary[ordered]
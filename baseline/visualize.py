@@ -8,91 +8,101 @@ Produces:
 1. FDR vs alpha (for each method)
 2. Power vs pi0 (for each method)
 
-Figures are saved as high-resolution PDFs.
+Figures are saved as high-resolution PDFs. The summary table,
+with bootstrap confidence intervals, is saved to
+results/raw/simulation_summary.csv.
 
 Author: Dili K. Maduabum
 Last Edited: October 21, 2025
 """
 
 import os
-import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
-
-# Load simulation results
-data_path = os.path.join("results", "raw", "simulation_results.csv")
-df = pd.read_csv(data_path)
-
-# Summarize average FDR and Power across replications
-summary = (
-    df.groupby(["method", "m", "pi0", "effect_size", "alpha"])
-      .agg(
-          FDR_mean=("FDR", "mean"),
-          FDR_sd=("FDR", "std"),
-          Power_mean=("Power", "mean"),
-          Power_sd=("Power", "std")
-      )
-      .reset_index()
-)
-
-# Ensure figure directory exists
-os.makedirs("results/figures", exist_ok=True)
-
-# Set default plot style
-sns.set_style("whitegrid")
-
-# ----------------------------------------------------
-# Figure 1: FDR vs Alpha
-# ----------------------------------------------------
-fig, ax = plt.subplots(figsize=(6, 4))
-
-sns.lineplot(
-    data=summary,
-    x="alpha",
-    y="FDR_mean",
-    hue="method",
-    style="method",
-    markers=True,
-    ax=ax
-)
-
-ax.set_title("Average FDR by Method and Alpha Level")
-ax.set_xlabel("Nominal FDR Level (α)")
-ax.set_ylabel("Mean False Discovery Rate")
-
-# Reference line y = x
-ax.plot([0, 0.1], [0, 0.1], 'k--', linewidth=1, label="y = x")
-ax.legend(title="Method", loc="upper left")
-
-plt.tight_layout()
-plt.savefig("results/figures/fdr_vs_alpha.pdf", dpi=300, bbox_inches="tight")
-plt.close()
-
-print("Figure 1 saved: fdr_vs_alpha.pdf")
-
-# ----------------------------------------------------
-# Figure 2: Power vs pi0
-# ----------------------------------------------------
-fig, ax = plt.subplots(figsize=(6, 4))
-
-sns.lineplot(
-    data=summary,
-    x="pi0",
-    y="Power_mean",
-    hue="method",
-    style="method",
-    markers=True,
-    ax=ax
-)
-
-ax.set_title("Average Power by Method and Proportion of True Nulls")
-ax.set_xlabel(r"Proportion of True Nulls ($\pi_0$)")
-ax.set_ylabel("Mean Power")
-ax.legend(title="Method", loc="upper right")
-
-plt.tight_layout()
-plt.savefig("results/figures/power_vs_pi0.pdf", dpi=300, bbox_inches="tight")
-plt.close()
-
-print("Figure 2 saved: power_vs_pi0.pdf")
-print("\nAll figures saved in results/figures/")
+
+from baseline.metrics import load_results
+from baseline.summary import summarize
+
+
+def main():
+    """
+    Load the raw simulation results, summarize them and save
+    both figures. All work happens here rather than at import
+    time; pandas, matplotlib and seaborn are loaded on call.
+    """
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    # Load simulation results
+    data_path = os.path.join("results", "raw", "simulation_results.csv")
+    df = load_results(data_path)   # FDR and Power derived from counts
+
+    # Summarize average FDR and Power across replications,
+    # with bootstrap CIs for every method and condition
+    summary = summarize(df)
+    summary.to_csv("results/raw/simulation_summary.csv", index=False)
+    print("Summary saved: results/raw/simulation_summary.csv")
+
+    # Ensure figure directory exists
+    os.makedirs("results/figures", exist_ok=True)
+
+    # Set default plot style
+    sns.set_style("whitegrid")
+
+    # ----------------------------------------------------
+    # Figure 1: FDR vs Alpha
+    # ----------------------------------------------------
+    fig, ax = plt.subplots(figsize=(6, 4))
+
+    sns.lineplot(
+        data=summary,
+        x="alpha",
+        y="FDR_mean",
+        hue="method",
+        style="method",
+        markers=True,
+        ax=ax
+    )
+
+    ax.set_title("Average FDR by Method and Alpha Level")
+    ax.set_xlabel("Nominal FDR Level (α)")
+    ax.set_ylabel("Mean False Discovery Rate")
+
+    # Reference line y = x
+    ax.plot([0, 0.1], [0, 0.1], 'k--', linewidth=1, label="y = x")
+    ax.legend(title="Method", loc="upper left")
+
+    plt.tight_layout()
+    plt.savefig("results/figures/fdr_vs_alpha.pdf", dpi=300, bbox_inches="tight")
+    plt.close()
+
+    print("Figure 1 saved: fdr_vs_alpha.pdf")
+
+    # ----------------------------------------------------
+    # Figure 2: Power vs pi0
+    # ----------------------------------------------------
+    fig, ax = plt.subplots(figsize=(6, 4))
+
+    sns.lineplot(
+        data=summary,
+        x="pi0",
+        y="Power_mean",
+        hue="method",
+        style="method",
+        markers=True,
+        ax=ax
+    )
+
+    ax.set_title("Average Power by Method and Proportion of True Nulls")
+    ax.set_xlabel(r"Proportion of True Nulls ($\pi_0$)")
+    ax.set_ylabel("Mean Power")
+    ax.legend(title="Method", loc="upper right")
+
+    plt.tight_layout()
+    plt.savefig("results/figures/power_vs_pi0.pdf", dpi=300, bbox_inches="tight")
+    plt.close()
+
+    print("Figure 2 saved: power_vs_pi0.pdf")
+    print("\nAll figures saved in results/figures/")
+
+
+if __name__ == "__main__":
+    main()
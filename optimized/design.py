@@ -0,0 +1,198 @@
+"""
+design.py
+----------------------------------------------
+Inverse design: find the effect size (or number of
+tests m) at which a method reaches a target power or
+FDR, without a grid of full simulation runs.
+
+The metric is estimated on one fixed set of nsim
+replicates: replicate r always draws its noise from
+replicate_seed(seed, 0, r), whatever parameter value
+is being evaluated (common random numbers). The
+estimated metric is then a deterministic, nearly
+monotone function of the parameter, and bisection
+on it converges in a few dozen batched evaluations
+(sample-average approximation).
+
+The confidence interval on the solution uses the
+delta method: the standard error of the estimated
+metric at the solution divided by the slope of the
+metric there, itself estimated by a common-random-
+numbers finite difference.
+
+Usage:
+    python optimized/design.py --target 0.8 --parameter effect_size
+    python optimized/design.py --target 0.35 --parameter m \\
+        --effect-size 2.5
+
+Author: Dili K. Maduabum
+Last edit: November 2025
+"""
+
+import numpy as np
+from scipy.special import ndtri
+
+try:
+    from optimized.variance_reduction import simulate_counts
+except ImportError:
+    from variance_reduction import simulate_counts
+
+
+SEED = 4000
+PARAMETERS = ("effect_size", "m")
+METRICS = ("power", "fdr")
+
+# Default search interval for each parameter
+BRACKETS = {"effect_size": (0.0, 6.0), "m": (10, 10_000)}
+
+
+def estimate_metric(m, pi0, effect_size, alpha=0.05, nsim=1000, seed=SEED,
+                    metric="power", method="BH"):
+    """
+    Per-replicate power or FDP of one method on the common
+    replicates 0..nsim-1.
+
+    Returns
+    -------
+    np.ndarray, shape (nsim,)
+    """
+    counts = simulate_counts(int(m), pi0, effect_size, alpha, seed, 0,
+                             np.arange(nsim))
+    v, s = counts[f"V_{method}"], counts[f"S_{method}"]
+
+    if metric == "power":
+        m1 = int(m) - int(int(m) * pi0)
+        return s / m1 if m1 > 0 else np.zeros(nsim)
+    if metric == "fdr":
+        r = v + s
+        return np.where(r > 0, v / np.maximum(r, 1), 0.0)
+    raise ValueError(f"metric must be one of {METRICS}, got {metric!r}")
+
+
+def solve_design(target, parameter="effect_size", metric="power",
+                 bracket=None, m=1000, pi0=0.8, effect_size=2.5,
+                 alpha=0.05, nsim=1000, seed=SEED, method="BH",
+                 tol=1e-3, level=0.95):
+    """
+    Parameter value at which the metric reaches `target`.
+
+    Parameters
+    ----------
+    target : float
+        Target power or FDR.
+    parameter : {"effect_size", "m"}
+        Parameter to solve for; the other is held at its given value.
+    bracket : (float, float) or None
+        Search interval; the metric must cross the target inside it.
+        None uses BRACKETS[parameter]. For m both ends are rounded
+        to integers and the lower one must be at least 1.
+    tol : float
+        Bisection stops when the interval is shorter than tol
+        (1 for m, which is an integer).
+    level : float
+        Coverage of the delta-method confidence interval.
+
+    Returns
+    -------
+    dict
+        value, ci_lo, ci_hi, se, metric (estimate at value),
+        metric_se and n_evals (batched evaluations used).
+    """
+    if parameter not in PARAMETERS:
+        raise ValueError(f"parameter must be one of {PARAMETERS}, "
+                         f"got {parameter!r}")
+    if bracket is None:
+        bracket = BRACKETS[parameter]
+    integer = parameter == "m"
+    if integer:
+        bracket = tuple(int(b) for b in bracket)
+        if bracket[0] < 1:
+            raise ValueError(f"bracket for m must start at 1 or more, "
+                             f"got {bracket}")
+        tol = max(tol, 1)
+
+    n_evals = 0
+
+    def f(x):
+        nonlocal n_evals
+        n_evals += 1
+        params = {"m": m, "effect_size": effect_size, parameter: x}
+        values = estimate_metric(params["m"], pi0, params["effect_size"],
+                                 alpha, nsim, seed, metric, method)
+        return values.mean(), values.std(ddof=1) / np.sqrt(nsim)
+
+    lo, hi = bracket
+    f_lo, f_hi = f(lo)[0] - target, f(hi)[0] - target
+    if f_lo * f_hi > 0:
+        raise ValueError(f"{metric} does not cross {target} in {bracket} "
+                         f"({f_lo + target:.4f} .. {f_hi + target:.4f})")
+
+    # Bisection on the common-random-numbers estimate
+    while hi - lo > tol:
+        mid = (lo + hi) // 2 if integer else (lo + hi) / 2
+        g = f(mid)[0] - target
+        if g * f_lo > 0:
+            lo, f_lo = mid, g
+        else:
+            hi, f_hi = mid, g
+
+    value = hi if integer else (lo + hi) / 2
+    estimate, metric_se = f(value)
+
+    # Slope at the solution by a central difference on the same replicates
+    if integer:
+        h = max(1, int(round(0.05 * value)))
+        x0, x1 = max(bracket[0], value - h), value + h
+    else:
+        h = max(10 * tol, 0.02 * abs(value))
+        x0, x1 = value - h, value + h
+    slope = (f(x1)[0] - f(x0)[0]) / (x1 - x0)
+
+    se = metric_se / abs(slope) if slope != 0 else np.inf
+    z = ndtri(0.5 + level / 2)
+
+    return {
+        "parameter": parameter,
+        "value": value,
+        "ci_lo": value - z * se,
+        "ci_hi": value + z * se,
+        "se": se,
+        "metric": estimate,
+        "metric_se": metric_se,
+        "n_evals": n_evals,
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--target", type=float, required=True,
+                        help="Target power or FDR.")
+    parser.add_argument("--parameter", choices=PARAMETERS,
+                        default="effect_size")
+    parser.add_argument("--metric", choices=METRICS, default="power")
+    parser.add_argument("--method", choices=("BH", "Bonferroni",
+                                             "Uncorrected"), default="BH")
+    parser.add_argument("--bracket", type=float, nargs=2, default=None,
+                        help="Search interval (default: 0 6 for "
+                             "effect_size, 10 10000 for m).")
+    parser.add_argument("--m", type=int, default=1000)
+    parser.add_argument("--pi0", type=float, default=0.8)
+    parser.add_argument("--effect-size", type=float, default=2.5)
+    parser.add_argument("--alpha", type=float, default=0.05)
+    parser.add_argument("--nsim", type=int, default=1000)
+    parser.add_argument("--level", type=float, default=0.95,
+                        help="Confidence level of the interval.")
+    args = parser.parse_args()
+
+    res = solve_design(args.target, args.parameter, args.metric, args.bracket,
+                       m=args.m, pi0=args.pi0, effect_size=args.effect_size,
+                       alpha=args.alpha, nsim=args.nsim, method=args.method,
+                       level=args.level)
+
+    print(f"{args.parameter} = {res['value']:.4g} "
+          f"({100 * args.level:.0f}% CI {res['ci_lo']:.4g} .. "
+          f"{res['ci_hi']:.4g}); "
+          f"{args.metric} there = {res['metric']:.4f} "
+          f"+/- {res['metric_se']:.4f}; {res['n_evals']} batched evaluations")
@@ -0,0 +1,232 @@
+"""
+incremental_bh.py
+----------------------------------------------
+Incremental Benjamini-Hochberg procedure for p-value
+sets that change a few entries at a time.
+
+The p-values are kept sorted in a list of blocks
+(sqrt decomposition): each block holds parallel
+NumPy arrays of p-values and ids, and the block
+minima, maxima and sizes are tracked separately.
+
+insert / delete / update touch one block, O(sqrt m).
+
+The new BH cutoff is found without re-sorting: the
+last element of a block has the largest rank in it,
+so a block whose minimum exceeds that rank's BH
+threshold cannot contain a crossing. One vectorized
+pass over the block minima rules such blocks out, and
+the surviving blocks are scanned from the top until
+the largest crossing is found.
+
+Every change returns the new cutoff and the ids whose
+rejection status flipped.
+
+Author: Dili K. Maduabum
+Last edit: November 2025
+"""
+
+import bisect
+
+import numpy as np
+
+
+class IncrementalBH:
+    """
+    BH rejection set maintained under insert, delete and update.
+
+    Parameters
+    ----------
+    pvals : array-like
+        Initial p-values.
+    alpha : float
+        Target FDR level.
+    ids : array-like of int or None
+        Hypothesis ids (default 0..m-1).
+    block_size : int or None
+        Target block length (default about sqrt(m)).
+
+    Notes
+    -----
+    A hypothesis is rejected when its p-value is <= cutoff, so
+    the rejections always equal bh_procedure() on the current
+    p-values. The cutoff is -inf when nothing is rejected.
+    """
+
+    def __init__(self, pvals, alpha=0.05, ids=None, block_size=None):
+        pvals = np.asarray(pvals, dtype=float)
+        ids = np.arange(len(pvals)) if ids is None else np.asarray(ids)
+        self._pval = dict(zip(ids.tolist(), pvals.tolist()))
+        if len(self._pval) != len(ids):
+            raise ValueError("ids must be unique")
+
+        self.alpha = alpha
+        self.block_size = block_size or max(64, int(np.sqrt(len(pvals))))
+
+        order = np.argsort(pvals, kind="stable")
+        sorted_p, sorted_ids = pvals[order], ids[order]
+        b = self.block_size
+        self._p = [sorted_p[i:i + b] for i in range(0, len(pvals), b)]
+        self._ids = [sorted_ids[i:i + b] for i in range(0, len(pvals), b)]
+        self._maxes = [blk[-1] for blk in self._p]
+
+        self.cutoff = self._find_cutoff()
+
+    # ---------------------------------------------------
+    # Queries
+    # ---------------------------------------------------
+
+    def __len__(self):
+        return len(self._pval)
+
+    def is_rejected(self, id_):
+        return self._pval[id_] <= self.cutoff
+
+    def rejected_ids(self):
+        """
+        Ids of all rejected hypotheses, in increasing p-value order.
+        """
+        return self._ids_in_range(-np.inf, self.cutoff)
+
+    # ---------------------------------------------------
+    # Changes
+    # ---------------------------------------------------
+
+    def insert(self, id_, p):
+        """
+        Add hypothesis id_ with p-value p.
+
+        Returns
+        -------
+        (cutoff, newly_rejected, newly_accepted)
+            New cutoff and the ids (np.ndarray) that flipped.
+        """
+        if id_ in self._pval:
+            raise KeyError(f"id {id_} is already present")
+        self._insert(id_, float(p))
+        return self._refresh(id_, None)
+
+    def delete(self, id_):
+        """
+        Remove hypothesis id_. Returns as insert(); id_ itself is
+        not reported as a flip.
+        """
+        old_p = self._remove(id_)
+        return self._refresh(None, old_p)
+
+    def update(self, id_, p):
+        """
+        Change the p-value of hypothesis id_. Returns as insert().
+        """
+        old_p = self._remove(id_)
+        self._insert(id_, float(p))
+        return self._refresh(id_, old_p)
+
+    # ---------------------------------------------------
+    # Internals
+    # ---------------------------------------------------
+
+    def _insert(self, id_, p):
+        j = min(bisect.bisect_left(self._maxes, p), len(self._p) - 1)
+        if j < 0:
+            # Structure is empty
+            self._p, self._ids, self._maxes = [np.array([p])], \
+                [np.array([id_])], [p]
+            self._pval[id_] = p
+            return
+
+        blk = self._p[j]
+        i = np.searchsorted(blk, p, side="right")
+        self._p[j] = np.insert(blk, i, p)
+        self._ids[j] = np.insert(self._ids[j], i, id_)
+        self._maxes[j] = self._p[j][-1]
+        self._pval[id_] = p
+
+        # Split oversized blocks to keep every block O(sqrt m)
+        if len(self._p[j]) > 2 * self.block_size:
+            half = len(self._p[j]) // 2
+            self._p[j:j + 1] = [self._p[j][:half], self._p[j][half:]]
+            self._ids[j:j + 1] = [self._ids[j][:half], self._ids[j][half:]]
+            self._maxes[j:j + 1] = [self._p[j][-1], self._p[j + 1][-1]]
+
+    def _remove(self, id_):
+        p = self._pval.pop(id_)
+
+        # Ties may spread one p-value over several blocks
+        j = bisect.bisect_left(self._maxes, p)
+        while True:
+            blk = self._p[j]
+            lo = np.searchsorted(blk, p, side="left")
+            hi = np.searchsorted(blk, p, side="right")
+            hit = np.flatnonzero(self._ids[j][lo:hi] == id_)
+            if len(hit):
+                break
+            j += 1
+
+        i = lo + hit[0]
+        if len(blk) == 1:
+            del self._p[j], self._ids[j], self._maxes[j]
+        else:
+            self._p[j] = np.delete(blk, i)
+            self._ids[j] = np.delete(self._ids[j], i)
+            self._maxes[j] = self._p[j][-1]
+        return p
+
+    def _find_cutoff(self):
+        m = len(self._pval)
+        if m == 0:
+            return -np.inf
+
+        sizes = np.array([len(blk) for blk in self._p])
+        ends = np.cumsum(sizes)
+        mins = np.array([blk[0] for blk in self._p])
+
+        # Same threshold arithmetic as bh_procedure(): (k / m) * alpha
+        maybe = np.flatnonzero(mins <= (ends / m) * self.alpha)
+
+        for j in maybe[::-1]:
+            ranks = np.arange(ends[j] - sizes[j] + 1, ends[j] + 1)
+            passed = np.flatnonzero(self._p[j] <= (ranks / m) * self.alpha)
+            if len(passed):
+                return float(self._p[j][passed[-1]])
+        return -np.inf
+
+    def _ids_in_range(self, lo, hi):
+        """Ids with lo < p <= hi, in increasing p-value order."""
+        if not hi > lo:
+            return np.array([], dtype=int)
+        out = []
+        for j in range(bisect.bisect_right(self._maxes, lo), len(self._p)):
+            blk = self._p[j]
+            if blk[0] > hi:
+                break
+            a = np.searchsorted(blk, lo, side="right")
+            b = np.searchsorted(blk, hi, side="right")
+            out.append(self._ids[j][a:b])
+        return np.concatenate(out) if out else np.array([], dtype=int)
+
+    def _refresh(self, changed, old_p):
+        """
+        Recompute the cutoff and collect flips. `changed` is the id
+        inserted or updated (None on delete) and old_p its previous
+        p-value (None on insert).
+        """
+        old, new = self.cutoff, self._find_cutoff()
+        self.cutoff = new
+
+        newly_rejected = self._ids_in_range(old, new)
+        newly_accepted = self._ids_in_range(new, old)
+
+        if changed is not None:
+            # The changed id moved, so the ranges above judged it by
+            # its new p-value only: compare both statuses directly
+            newly_rejected = newly_rejected[newly_rejected != changed]
+            newly_accepted = newly_accepted[newly_accepted != changed]
+            was = old_p is not None and old_p <= old
+            now = self._pval[changed] <= new
+            if now and not was:
+                newly_rejected = np.append(newly_rejected, changed)
+            elif was and not now:
+                newly_accepted = np.append(newly_accepted, changed)
+
+        return new, newly_rejected, newly_accepted
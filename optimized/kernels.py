@@ -0,0 +1,464 @@
+"""
+kernels.py
+----------------------------------------------
+Compute-only kernels for the optimized BH (1995)
+simulation: data generation (z-scores or raw-data
+t-tests or permutation tests), the vectorized BH
+procedure and a single replicate.
+
+This module is what parallel workers import, so it
+depends only on NumPy and scipy.special. Anything that
+writes output (pandas, matplotlib, seaborn) lives in
+the driver scripts and is imported there, lazily.
+
+The result-file schema (count columns and their type)
+and its reader read_counts_csv() belong to
+baseline.metrics and are re-exported here; a copy is
+used only when a script runs standalone without the
+repository root on sys.path.
+
+Author: Dili K. Maduabum
+Last edit: November 2025
+"""
+
+import numpy as np
+from scipy.special import ndtr, stdtr
+
+try:
+    from optimized.sketch import PValueSketch
+except ImportError:
+    from sketch import PValueSketch
+
+try:
+    from baseline.metrics import (
+        BOUND_COLUMNS, COUNT_COLUMNS, COUNT_DTYPE, read_counts_csv
+    )
+except ImportError:
+    # Standalone run (python optimized/<script>.py): the baseline
+    # package is not importable, so use a copy of its schema;
+    # tests/test_regression.py checks the two agree
+    COUNT_COLUMNS = ("V", "R", "S", "m1")
+    COUNT_DTYPE = "uint32"
+    BOUND_COLUMNS = ("R_lo", "R_hi")
+
+    def read_counts_csv(path):
+        """
+        Read a results CSV with the count columns as COUNT_DTYPE
+        (see baseline.metrics.read_counts_csv).
+        """
+        import os
+        import pandas as pd
+
+        if os.path.getsize(path) == 0:
+            return pd.DataFrame()
+        header = pd.read_csv(path, nrows=0).columns
+        dtypes = {c: COUNT_DTYPE for c in COUNT_COLUMNS + BOUND_COLUMNS
+                  if c in header}
+        return pd.read_csv(path, float_precision="round_trip", dtype=dtypes)
+
+
+# Standard normals drawn per block by the t-test DGP, and
+# gathered values per block by the permutation DGP (8 MB)
+CHUNK_ELEMENTS = 1 << 20
+
+# Label permutations per permutation test
+N_PERM = 999
+
+TESTS = ("welch", "student", "permutation")
+
+
+# -------------------------------------------------------
+# Random Streams
+# -------------------------------------------------------
+
+def replicate_seed(seed, condition, rep):
+    """
+    SeedSequence addressing one (condition, replicate) stream.
+
+    The stream depends only on (seed, condition, rep), never on
+    which batch, core, backend or shard runs the replicate, so
+    results are bit-identical however the work is split.
+
+    Parameters
+    ----------
+    seed : int
+        Base seed of the study.
+    condition : int
+        Index of the condition in the driver's design grid.
+    rep : int
+        Replicate index within the condition.
+    """
+    return np.random.SeedSequence(seed, spawn_key=(condition, rep))
+
+
+def make_rng(seed=None):
+    """
+    Counter-based (Philox) Generator from a seed.
+
+    Parameters
+    ----------
+    seed : None, int, SeedSequence or Generator
+        A Generator is returned unchanged; anything else seeds
+        a fresh Philox stream.
+    """
+    if isinstance(seed, np.random.Generator):
+        return seed
+    return np.random.Generator(np.random.Philox(seed))
+
+
+# -------------------------------------------------------
+# Vectorized Data Generation
+# -------------------------------------------------------
+
+def generate_pvalues_vectorized(m, pi0, effect_size, seed=None):
+    """
+    Vectorized p-value generation.
+
+    Under null: X ~ N(0,1)
+    Under alt:  X ~ N(effect_size, 1)
+
+    Parameters
+    ----------
+    seed : None, int, SeedSequence or Generator
+        See make_rng(). Each call owns its stream, so this is
+        safe to call from several threads at once.
+
+    Returns
+    -------
+    pvals : np.ndarray  shape (m,)
+    is_null : np.ndarray bool mask
+    """
+    rng = make_rng(seed)
+
+    m0 = int(m * pi0)
+    m1 = m - m0
+
+    # Single vector of z-values
+    z = np.empty(m)
+    z[:m0] = rng.normal(0, 1, m0)
+    z[m0:] = rng.normal(effect_size, 1, m1)
+
+    # Upper tail via ndtr(-|z|): no cancellation in 1 - cdf
+    pvals = 2 * ndtr(-np.abs(z))
+
+    is_null = np.zeros(m, dtype=bool)
+    is_null[:m0] = True
+
+    return pvals, is_null
+
+
+# -------------------------------------------------------
+# Raw-Data t-Test Generation
+# -------------------------------------------------------
+
+def _merge_moments(moments, block):
+    """
+    Merge a (rows, k) block of observations into running
+    per-row (count, mean, M2), the pairwise update of
+    Chan, Golub & LeVeque (1979).
+    """
+    count, mean, m2 = moments
+    k = block.shape[1]
+    if k == 0:
+        return moments
+
+    block_mean = block.mean(axis=1)
+    block_m2 = ((block - block_mean[:, None]) ** 2).sum(axis=1)
+
+    total = count + k
+    delta = block_mean - mean
+    return (total,
+            mean + delta * (k / total),
+            m2 + block_m2 + delta ** 2 * (count * k / total))
+
+
+def ttest_pvalues(mean_a, var_a, n_a, mean_b, var_b, n_b, test="welch"):
+    """
+    Two-sided two-sample t-test p-values from group moments.
+
+    Parameters
+    ----------
+    test : {"welch", "student"}
+        Unequal-variance (Welch-Satterthwaite df) or pooled-
+        variance t-test.
+    """
+    if test == "student":
+        df = n_a + n_b - 2
+        pooled = ((n_a - 1) * var_a + (n_b - 1) * var_b) / df
+        se2 = pooled * (1 / n_a + 1 / n_b)
+    elif test == "welch":
+        va, vb = var_a / n_a, var_b / n_b
+        se2 = va + vb
+        df = se2 ** 2 / (va ** 2 / (n_a - 1) + vb ** 2 / (n_b - 1))
+    else:
+        raise ValueError(f"test must be 'welch' or 'student', got {test!r}")
+
+    t = (mean_b - mean_a) / np.sqrt(se2)
+    return 2 * stdtr(df, -np.abs(t))
+
+
+def generate_pvalues_ttest_vectorized(m, pi0, effect_size, n=20,
+                                      test="welch", sd_ratio=1.0,
+                                      seed=None):
+    """
+    Two-sample t-test p-values computed from raw data.
+
+    Each test compares n observations of group A ~ N(0, 1) with n
+    of group B ~ N(delta, sd_ratio^2), where delta = 0 under the
+    null and effect_size under the alternative.
+
+    The (m, 2n) data matrix is never held in memory: it is drawn
+    row-major in blocks of at most CHUNK_ELEMENTS values (whole
+    rows when they fit, row pieces otherwise) and reduced to
+    per-row moments with _merge_moments(). Because the draws are
+    row-major the data, and so the p-values, do not depend on the
+    block size.
+
+    Returns
+    -------
+    pvals : np.ndarray  shape (m,)
+    is_null : np.ndarray bool mask
+    """
+    if n < 2:
+        # The sample variances below divide by n - 1
+        raise ValueError(f"need n >= 2 observations per group, got {n}")
+
+    rng = make_rng(seed)
+
+    m0 = int(m * pi0)
+    shift = np.zeros(m)
+    shift[m0:] = effect_size
+
+    width = 2 * n   # row layout: n values of A, then n of B
+    rows = max(1, CHUNK_ELEMENTS // width)
+    cols = min(width, CHUNK_ELEMENTS)
+
+    pvals = np.empty(m)
+    for lo in range(0, m, rows):
+        hi = min(m, lo + rows)
+        a = b = (0, np.zeros(hi - lo), np.zeros(hi - lo))
+
+        for c0 in range(0, width, cols):
+            z = rng.standard_normal((hi - lo, min(cols, width - c0)))
+            split = min(max(n - c0, 0), z.shape[1])
+            a = _merge_moments(a, z[:, :split])
+            b = _merge_moments(b, shift[lo:hi, None] + sd_ratio * z[:, split:])
+
+        pvals[lo:hi] = ttest_pvalues(a[1], a[2] / (n - 1), n,
+                                     b[1], b[2] / (n - 1), n, test)
+
+    is_null = np.zeros(m, dtype=bool)
+    is_null[:m0] = True
+
+    return pvals, is_null
+
+
+# -------------------------------------------------------
+# Permutation-Test Generation
+# -------------------------------------------------------
+
+def generate_pvalues_permutation_vectorized(m, pi0, effect_size, n=20,
+                                            n_perm=N_PERM, sd_ratio=1.0,
+                                            seed=None):
+    """
+    Two-sample permutation-test p-values for all m tests at once.
+
+    The data are as in generate_pvalues_ttest_vectorized(): n
+    observations of group A ~ N(0, 1) and n of group B ~
+    N(delta, sd_ratio^2) per test. The statistic is the absolute
+    difference in group means, and
+
+        p = (1 + #{b : |T_b| >= |T_obs|}) / (n_perm + 1).
+
+    The same n_perm random relabellings are applied to every test
+    (as when permuting sample labels across features). Each one is
+    an index array of the n positions labelled B, so the permuted
+    group sums of a block of rows are a single gather
+    x[:, idx].sum(axis=2). Rows and permutations are processed in
+    blocks with rows * perms * n <= CHUNK_ELEMENTS, so the
+    (m, n_perm, n) gather never materializes. The permutations are
+    drawn first and the data row-major after them, so the p-values
+    do not depend on the block sizes.
+
+    Returns
+    -------
+    pvals : np.ndarray  shape (m,)
+    is_null : np.ndarray bool mask
+    """
+    rng = make_rng(seed)
+
+    width = 2 * n   # row layout: n values of A, then n of B
+    labels = rng.permuted(np.tile(np.arange(width), (n_perm, 1)), axis=1)
+    idx = labels[:, :n]   # positions labelled B, shape (n_perm, n)
+
+    m0 = int(m * pi0)
+    shift = np.zeros(m)
+    shift[m0:] = effect_size
+
+    perms = min(n_perm, max(1, CHUNK_ELEMENTS // n))
+    rows = max(1, CHUNK_ELEMENTS // (perms * n))
+
+    pvals = np.empty(m)
+    for lo in range(0, m, rows):
+        hi = min(m, lo + rows)
+        x = rng.standard_normal((hi - lo, width))
+        x[:, n:] = shift[lo:hi, None] + sd_ratio * x[:, n:]
+
+        # mean_B - mean_A = (2 sum_B - total) / n; the 1/n cancels
+        total = x.sum(axis=1, keepdims=True)
+        observed = np.abs(2 * x[:, n:].sum(axis=1) - total[:, 0])
+
+        # Ties up to summation-order rounding count as exceedances
+        observed -= 1e-12 * np.abs(x).sum(axis=1)
+
+        exceed = np.zeros(hi - lo, dtype=np.int64)
+        for b0 in range(0, n_perm, perms):
+            sums = x[:, idx[b0:b0 + perms]].sum(axis=2)
+            exceed += (np.abs(2 * sums - total) >= observed[:, None]).sum(axis=1)
+
+        pvals[lo:hi] = (1 + exceed) / (n_perm + 1)
+
+    is_null = np.zeros(m, dtype=bool)
+    is_null[:m0] = True
+
+    return pvals, is_null
+
+
+# -------------------------------------------------------
+# Vectorized BH FDR Procedure
+# -------------------------------------------------------
+
+def benjamini_hochberg_vectorized(pvals, alpha=0.05, approx=False,
+                                  return_bounds=False):
+    """
+    Fully vectorized BH procedure.
+
+    Parameters
+    ----------
+    approx : bool
+        Skip the sort and use the cutoff from a one-pass p-value
+        sketch (see sketch.py). Every approximate rejection is a
+        BH rejection; the count is at least the sketch's R_lo.
+    return_bounds : bool
+        With approx, also return the sketch's bounds
+        {"R_lo", "R_hi", "cutoff"} on the exact BH count.
+
+    Returns
+    -------
+    rejected : boolean array
+        (rejected, bounds) when approx and return_bounds are set.
+    """
+    if approx:
+        bounds = PValueSketch.from_pvalues(pvals).bh_bounds(alpha)
+        rejected = pvals <= bounds["cutoff"]
+        return (rejected, bounds) if return_bounds else rejected
+
+    m = len(pvals)
+    order = np.argsort(pvals)
+    ordered_p = pvals[order]
+
+    thresholds = (np.arange(1, m+1) / m) * alpha
+    passed = ordered_p <= thresholds
+
+    if not np.any(passed):
+        return np.zeros(m, dtype=bool)
+
+    k = np.max(np.where(passed))
+    cutoff = ordered_p[k]
+
+    return pvals <= cutoff
+
+
+def benjamini_hochberg_batch(pvals, alpha=0.05):
+    """
+    BH procedure applied to every row of a (nsim, m) array.
+
+    Row r gives the same rejections as
+    benjamini_hochberg_vectorized(pvals[r], alpha).
+
+    Returns
+    -------
+    rejected : boolean array, shape (nsim, m)
+    """
+    nsim, m = pvals.shape
+    ordered = np.sort(pvals, axis=1)
+
+    thresholds = (np.arange(1, m+1) / m) * alpha
+    passed = ordered <= thresholds
+
+    # Largest passing index per row (rows with none get -inf cutoff)
+    k = m - 1 - np.argmax(passed[:, ::-1], axis=1)
+    cutoff = np.where(passed.any(axis=1),
+                      ordered[np.arange(nsim), k], -np.inf)
+
+    return pvals <= cutoff[:, None]
+
+
+# -------------------------------------------------------
+# Optimized Single Simulation
+# -------------------------------------------------------
+
+def run_single_sim_opt(m, pi0, effect_size, alpha=0.05, seed=None,
+                       n_obs=None, test="welch", approx=False):
+    """
+    Run a single optimized simulation replicate.
+
+    With n_obs set, p-values come from two-sample tests on raw
+    data with n_obs observations per group: t-tests (see
+    generate_pvalues_ttest_vectorized) or, with
+    test="permutation", N_PERM-permutation tests (see
+    generate_pvalues_permutation_vectorized). Otherwise they
+    come from z-scores. approx=True uses the one-pass sketch
+    cutoff of benjamini_hochberg_vectorized instead of a sort
+    and adds its bounds R_lo <= R_exact <= R_hi to the counts
+    (BOUND_COLUMNS).
+    """
+    if n_obs is None:
+        pvals, is_null = generate_pvalues_vectorized(m, pi0, effect_size, seed)
+    elif test == "permutation":
+        pvals, is_null = generate_pvalues_permutation_vectorized(
+            m, pi0, effect_size, n_obs, seed=seed)
+    else:
+        pvals, is_null = generate_pvalues_ttest_vectorized(
+            m, pi0, effect_size, n_obs, test, seed=seed)
+
+    if approx:
+        rejected, bounds = benjamini_hochberg_vectorized(
+            pvals, alpha, approx=True, return_bounds=True)
+    else:
+        rejected = benjamini_hochberg_vectorized(pvals, alpha)
+
+    # Integer counts only; FDR and power are derived on load
+    # (see baseline.metrics), so results can be re-aggregated
+    record = {
+        "m": m,
+        "pi0": pi0,
+        "effect_size": effect_size,
+        "alpha": alpha,
+        "V": int(np.sum(rejected & is_null)),
+        "R": int(np.sum(rejected)),
+        "S": int(np.sum(rejected & ~is_null)),
+        "m1": int(np.sum(~is_null)),
+    }
+    if approx:
+        record.update({c: bounds[c] for c in BOUND_COLUMNS})
+    return record
+
+
+def run_batch_opt(m, pi0, effect_size, alpha, seed, condition, reps,
+                  n_obs=None, test="welch", approx=False):
+    """
+    Run a batch of replicates for one condition.
+
+    Parallel drivers send one task per batch (instead of one
+    per replicate), so dispatch overhead scales with the
+    number of batches. Replicate `rep` always draws from
+    replicate_seed(seed, condition, rep).
+    """
+    return [
+        run_single_sim_opt(m=m, pi0=pi0, effect_size=effect_size,
+                           alpha=alpha,
+                           seed=replicate_seed(seed, condition, int(r)),
+                           n_obs=n_obs, test=test, approx=approx)
+        for r in reps
+    ]
@@ -2,78 +2,293 @@
 parallel_simulation.py
 ----------------------------------------------
 Parallelized simulation using joblib for BH (1995)
-FDR simulation. Each replicate runs in parallel.
+FDR simulation. Replicates are grouped into batches
+and dispatched to one of three backends:
+
+- "threads"   : joblib threading backend (NumPy sort/cdf
+                release the GIL, so no spawn or pickling)
+- "processes" : joblib loky process pool
+- "serial"    : plain loop in the calling process
+
+With backend="auto" the choice is made per condition
+from m, nsim and the core count, using a cost model whose
+constants come from a short startup probe.
 
 Author: Dili K. Maduabum
 Last edit: November 2025
 """
 
 import argparse
+import time
 import numpy as np
-import pandas as pd
-import os
-from joblib import Parallel, delayed
+from joblib import Parallel, delayed, effective_n_jobs
+
+# Workers unpickle run_batch_opt from the import-light kernels
+# module, so a fresh worker never loads pandas.
+try:
+    from optimized.kernels import read_counts_csv, run_batch_opt
+    from optimized.pipeline import BATCH_SIZE, iter_tasks, run_pipeline
+    from optimized.sharding import parse_shard, shard_path
+    from optimized.simulation_opt import CONDITIONS
+    from optimized.tail_metrics import TailMetrics, write_tails
+except ImportError:
+    from kernels import read_counts_csv, run_batch_opt
+    from pipeline import BATCH_SIZE, iter_tasks, run_pipeline
+    from sharding import parse_shard, shard_path
+    from simulation_opt import CONDITIONS
+    from tail_metrics import TailMetrics, write_tails
+
+
+BACKENDS = ("auto", "threads", "processes", "serial")
+
+SEED = 2000  # Base seed; replicate streams are keyed on (condition, rep)
+
+# Cost-model constants from calibrate_backends(), per core count
+# (the pool probes are timed with that many workers)
+_CALIBRATION = {}
 
-from simulation_opt import run_single_sim_opt
 
+def _noop():
+    return None
 
-def run_parallel_simulation(n_cores=1, nsim=1000):
+
+# -------------------------------------------------------
+# Backend calibration and selection
+# -------------------------------------------------------
+
+def calibrate_backends(n_cores=2, probe_m=(100, 2000), probe_reps=20):
     """
-    Run the optimized simulation in parallel.
+    Measure the constants of the backend cost model.
+
+    The probe times
+    - the per-replicate cost at two values of m, giving a
+      fixed (Python, GIL-bound) part and a per-hypothesis
+      (NumPy, GIL-free) part,
+    - the fixed cost of starting a thread pool,
+    - the fixed cost of starting a process pool, and
+    - the per-task cost of a process pool round trip.
 
     Parameters
     ----------
     n_cores : int
-        Number of CPU cores to use.
-    nsim : int
-        Replicates per condition.
+        Pool size used for the pool probes.
+    probe_m : tuple of int
+        Two values of m used to fit the per-replicate cost.
+    probe_reps : int
+        Replicates timed at each probe m.
 
     Returns
     -------
-    pd.DataFrame
+    dict
+        Calibrated constants (seconds).
     """
+    n_cores = max(2, n_cores)
+    costs = []
+    for m in probe_m:
+        run_batch_opt(m, 0.8, 2.5, 0.05, 0, 0, [0])  # warm-up
+        start = time.perf_counter()
+        run_batch_opt(m, 0.8, 2.5, 0.05, 0, 0, range(probe_reps))
+        costs.append((time.perf_counter() - start) / probe_reps)
 
-    conditions = [
-        (100, 0.8, 2.5),
-        (500, 0.8, 2.5),
-        (1000, 0.8, 2.5)
-    ]
+    # cost(m) = rep_fixed + rep_per_m * m
+    rep_per_m = max((costs[1] - costs[0]) / (probe_m[1] - probe_m[0]), 0.0)
+    rep_fixed = max(costs[0] - rep_per_m * probe_m[0], 0.0)
 
-    results = []
+    start = time.perf_counter()
+    Parallel(n_jobs=n_cores, backend="threading")(
+        delayed(_noop)() for _ in range(n_cores)
+    )
+    thread_start = time.perf_counter() - start
 
-    print(f"Running parallel simulation with {n_cores} cores...")
+    start = time.perf_counter()
+    Parallel(n_jobs=n_cores, backend="loky")(
+        delayed(_noop)() for _ in range(n_cores)
+    )
+    process_start = time.perf_counter() - start
+
+    # Pool is warm now: what is left is per-task IPC
+    n_tasks = 8 * n_cores
+    start = time.perf_counter()
+    Parallel(n_jobs=n_cores, backend="loky")(
+        delayed(_noop)() for _ in range(n_tasks)
+    )
+    process_task = (time.perf_counter() - start) / n_tasks
+
+    return {
+        "rep_fixed": rep_fixed,
+        "rep_per_m": rep_per_m,
+        "thread_start": thread_start,
+        "process_start": process_start,
+        "process_task": process_task,
+    }
+
+
+def predict_runtimes(m, nsim, n_cores, calibration):
+    """
+    Predict wall-clock time of each backend for one condition.
+
+    The fixed per-replicate part holds the GIL, so threads only
+    parallelize the part that scales with m; processes
+    parallelize everything but pay start-up and IPC costs.
+    """
+    c = calibration
+    fixed = nsim * c["rep_fixed"]
+    numeric = nsim * c["rep_per_m"] * m
+    n_batches = min(nsim, 4 * n_cores)
+
+    return {
+        "serial": fixed + numeric,
+        "threads": c["thread_start"] + fixed + numeric / n_cores,
+        "processes": (c["process_start"]
+                      + (fixed + numeric) / n_cores
+                      + n_batches * c["process_task"]),
+    }
+
+
+def select_backend(m, nsim, n_cores, calibration=None):
+    """
+    Choose the fastest backend for a condition.
+
+    Falls back to "serial" when only one core is available.
+    n_cores follows joblib's n_jobs convention (-1 is all
+    cores). The calibration probe runs once per process and
+    core count and is cached.
+
+    Returns
+    -------
+    str
+        One of "threads", "processes", "serial".
+    """
+    n_cores = effective_n_jobs(n_cores)
+    if n_cores <= 1:
+        return "serial"
+
+    if calibration is None:
+        if n_cores not in _CALIBRATION:
+            _CALIBRATION[n_cores] = calibrate_backends(n_cores)
+        calibration = _CALIBRATION[n_cores]
 
-    for m, pi0, eff in conditions:
+    predicted = predict_runtimes(m, nsim, n_cores, calibration)
+    return min(predicted, key=predicted.get)
 
-        seeds = 2000 + np.arange(nsim)
 
-        # >>> This is the joblib parallelism <<<
-        out = Parallel(n_jobs=n_cores)(
-            delayed(run_single_sim_opt)(
-                m=m, pi0=pi0, effect_size=eff,
-                alpha=0.05, seed=int(seeds[i])
-            )
-            for i in range(nsim)
-        )
+def _iter_condition(m, pi0, eff, alpha, seed, condition, reps,
+                    n_cores, backend, batch_size, approx=False):
+    """
+    Run replicates `reps` of one condition on the given backend,
+    yielding each batch of records in order as soon as it is done.
+    approx selects the sketch-based BH cutoff (see sketch.py).
+
+    Every replicate draws from its own addressable stream, so
+    the output does not depend on backend or batch_size.
+    """
+    if backend == "serial" or n_cores <= 1:
+        step = batch_size or BATCH_SIZE
+        for i in range(0, len(reps), step):
+            yield run_batch_opt(m, pi0, eff, alpha, seed, condition,
+                                reps[i:i + step], approx=approx)
+        return
 
-        results.extend(out)
+    if batch_size is None:
+        batch_size = max(1, int(np.ceil(len(reps) / (4 * n_cores))))
+    batches = [reps[i:i + batch_size]
+               for i in range(0, len(reps), batch_size)]
 
-    df = pd.DataFrame(results)
+    joblib_backend = "threading" if backend == "threads" else "loky"
+    yield from Parallel(n_jobs=n_cores, backend=joblib_backend,
+                        return_as="generator")(
+        delayed(run_batch_opt)(m, pi0, eff, alpha, seed, condition, b,
+                               approx=approx)
+        for b in batches
+    )
 
-    os.makedirs("results/raw", exist_ok=True)
-    df.to_csv("results/raw/parallel_opt_results.csv", index=False)
 
-    print("Parallel simulation complete.")
-    return df
+def run_parallel_simulation(n_cores=1, nsim=1000, backend="auto",
+                            batch_size=None, shard=None, return_df=True,
+                            approx=False):
+    """
+    Run the optimized simulation in parallel.
+
+    Finished batches go through the pipeline in pipeline.py,
+    so they are written, and added to the FDP and power
+    histograms of tail_metrics.py, while the workers compute
+    the next.
+
+    Parameters
+    ----------
+    n_cores : int
+        Number of CPU cores to use; negative values count back
+        from all cores as in joblib (-1 is all of them).
+    nsim : int
+        Replicates per condition.
+    backend : str
+        "auto", "threads", "processes" or "serial".
+    batch_size : int or None
+        Replicates per task. Defaults to about four
+        batches per core.
+    shard : tuple (index, count) or None
+        Run only this shard's block of the (condition, replicate)
+        space and write it to a shard file (see sharding.py).
+    return_df : bool
+        Read the written file back and return it.
+    approx : bool
+        Use the one-pass sketch cutoff instead of exact BH; the
+        results gain the bound columns R_lo and R_hi on the
+        exact BH count.
+
+    Returns
+    -------
+    pd.DataFrame or None
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"backend must be one of {BACKENDS}, got {backend!r}")
+
+    # Resolve -1 and friends before the serial fallbacks compare
+    # against 1
+    n_cores = effective_n_jobs(n_cores)
+    print(f"Running parallel simulation with {n_cores} cores...")
+
+    def batches():
+        # Same conditions and task order as simulation_opt.py; with
+        # batch_size=nsim, iter_tasks yields each condition's block
+        # of replicates in our shard at once, and the backend splits
+        # it into tasks
+        for c, (m, pi0, eff), reps in iter_tasks(
+                CONDITIONS, nsim, max(nsim, 1), shard):
+            chosen = backend
+            if backend == "auto":
+                chosen = select_backend(m, len(reps), n_cores)
+            print(f"  m={m}: {chosen} backend")
+
+            yield from _iter_condition(m, pi0, eff, 0.05, SEED, c, reps,
+                                       n_cores, chosen, batch_size, approx)
+
+    out_path = shard_path("results/raw/parallel_opt_results.csv", shard)
+    tails = TailMetrics()
+    run_pipeline(batches(), out_path, on_batch=tails.update_records)
+    write_tails(tails, "results/raw/parallel_opt_tails.csv", shard)
+
+    print(f"Parallel simulation complete. Results saved to {out_path}")
+    return read_counts_csv(out_path) if return_df else None
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--cores", type=int, default=1,
-                        help="Number of CPU cores to use.")
+                        help="Number of CPU cores to use (-1: all).")
     parser.add_argument("--nsim", type=int, default=1000,
                         help="Replicates per condition.")
+    parser.add_argument("--backend", choices=BACKENDS, default="auto",
+                        help="Execution backend (default: auto).")
+    parser.add_argument("--batch-size", type=int, default=None,
+                        help="Replicates per task (default: ~4 per core).")
+    parser.add_argument("--shard", type=parse_shard, default=None,
+                        help="Run shard i of N, given as i/N.")
+    parser.add_argument("--approx", action="store_true",
+                        help="Approximate BH from a one-pass p-value "
+                             "sketch instead of a sort.")
     args = parser.parse_args()
 
-    run_parallel_simulation(args.cores, args.nsim)
-
+    run_parallel_simulation(args.cores, args.nsim, args.backend,
+                            args.batch_size, args.shard, return_df=False,
+                            approx=args.approx)
@@ -0,0 +1,149 @@
+"""
+pipeline.py
+----------------------------------------------
+Producer/consumer pipeline that overlaps simulation
+with writing results.
+
+Three stages:
+1. iter_tasks()   yields (condition, reps) batches in
+                  the flat task order of sharding.py;
+2. a simulation   generator turns each batch into a
+   stage          list of records (the drivers supply it);
+3. BatchWriter    a thread that appends finished batches
+                  to the CSV while the next one computes,
+                  and hands them to an optional on_batch
+                  callback (e.g. streaming tail metrics).
+
+Stages 2 and 3 are joined by a bounded queue: when the
+writer falls behind, the producer blocks on put(), so at
+most QUEUE_SIZE batches are ever held in memory, and no
+DataFrame of the whole sweep is built.
+
+Author: Dili K. Maduabum
+Last edit: November 2025
+"""
+
+import csv
+import os
+import queue
+import threading
+
+import numpy as np
+
+try:
+    from optimized.sharding import shard_range
+except ImportError:
+    from sharding import shard_range
+
+
+QUEUE_SIZE = 4      # Record batches buffered between compute and writer
+BATCH_SIZE = 100    # Replicates per batch
+
+_DONE = object()
+
+
+# -------------------------------------------------------
+# Stage 1: Tasks
+# -------------------------------------------------------
+
+def iter_tasks(conditions, nsim, batch_size=BATCH_SIZE, shard=None):
+    """
+    Batches of replicates, condition by condition.
+
+    Yields
+    ------
+    (c, condition, reps)
+        Condition index, its parameters and an array of at most
+        batch_size replicate indices, restricted to the shard.
+    """
+    tasks = shard_range(len(conditions) * nsim, shard)
+
+    for c, condition in enumerate(conditions):
+        lo = max(tasks.start, c * nsim) - c * nsim
+        hi = min(tasks.stop, (c + 1) * nsim) - c * nsim
+        for start in range(lo, hi, batch_size):
+            yield c, condition, np.arange(start, min(hi, start + batch_size))
+
+
+# -------------------------------------------------------
+# Stage 3: Writer
+# -------------------------------------------------------
+
+class BatchWriter(threading.Thread):
+    """
+    Thread that writes record batches (lists of dicts with the
+    same keys) from a bounded queue to a CSV file.
+    """
+
+    def __init__(self, path, maxsize=QUEUE_SIZE, on_batch=None):
+        super().__init__(daemon=True)
+        self.path = path
+        self.on_batch = on_batch
+        self.queue = queue.Queue(maxsize)
+        self.n_records = 0
+        self.error = None
+        self.failed = threading.Event()
+
+    def run(self):
+        try:
+            with open(self.path, "w", newline="") as f:
+                writer = None
+                while True:
+                    batch = self.queue.get()
+                    if batch is _DONE:
+                        return
+                    if not batch:
+                        continue
+                    if writer is None:
+                        fields = list(batch[0])
+                        writer = csv.writer(f, lineterminator="\n")
+                        writer.writerow(fields)
+                    writer.writerows([rec[k] for k in fields] for rec in batch)
+                    self.n_records += len(batch)
+                    if self.on_batch is not None:
+                        self.on_batch(batch)
+        except BaseException as exc:
+            self.error = exc
+            self.failed.set()
+            # Keep consuming so the producer never blocks forever
+            while self.queue.get() is not _DONE:
+                pass
+
+
+def run_pipeline(batches, path, maxsize=QUEUE_SIZE, on_batch=None):
+    """
+    Drain an iterable of record batches into `path`, writing on a
+    background thread while the next batch is computed.
+
+    on_batch, if given, is called with every written batch on the
+    writer thread. If the writer fails, no further batches are
+    requested from `batches` and its error is raised.
+
+    Returns
+    -------
+    int
+        Number of records written.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    writer = BatchWriter(path, maxsize, on_batch)
+    writer.start()
+    batches = iter(batches)
+    try:
+        # Stop producing as soon as the writer has failed, instead
+        # of computing the rest of the sweep for nothing
+        while not writer.failed.is_set():
+            batch = next(batches, _DONE)
+            if batch is _DONE:
+                break
+            writer.queue.put(batch)   # blocks while the queue is full
+    finally:
+        writer.queue.put(_DONE)
+        writer.join()
+        if hasattr(batches, "close"):
+            batches.close()
+
+    if writer.error is not None:
+        raise writer.error
+    return writer.n_records
+
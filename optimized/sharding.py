@@ -0,0 +1,148 @@
+"""
+sharding.py
+----------------------------------------------
+Shard-and-merge helpers for running one simulation
+study across several machines.
+
+The (condition, replicate) space of a driver is
+flattened into task indices 0..n_tasks-1 in the
+order a single-node run visits them. Shard i of N
+takes a contiguous block of that order, and every
+task keeps the seed it would get on a single node,
+so concatenating the shard outputs in shard order
+reproduces the single-node output exactly.
+
+Usage:
+    python optimized/simulation_opt.py --shard 0/4
+    ...
+    python optimized/simulation_opt.py --shard 3/4
+    python optimized/sharding.py merge results/raw/simulation_opt.csv --count 4
+
+Author: Dili K. Maduabum
+Last edit: November 2025
+"""
+
+import argparse
+import os
+
+try:
+    from optimized.kernels import read_counts_csv
+except ImportError:
+    from kernels import read_counts_csv
+
+
+def parse_shard(text):
+    """
+    Parse a shard specification of the form "i/N".
+
+    Returns
+    -------
+    tuple (index, count)
+        0 <= index < count.
+    """
+    try:
+        index, count = (int(x) for x in text.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            f"shard must look like i/N, got {text!r}"
+        )
+    if count < 1 or not 0 <= index < count:
+        raise argparse.ArgumentTypeError(
+            f"shard index must satisfy 0 <= i < N, got {text!r}"
+        )
+    return index, count
+
+
+def shard_range(n_tasks, shard=None):
+    """
+    Task indices owned by one shard.
+
+    Parameters
+    ----------
+    n_tasks : int
+        Total number of (condition, replicate) tasks.
+    shard : tuple (index, count) or None
+        None means the whole task space.
+
+    Returns
+    -------
+    range
+        Contiguous block of task indices. Blocks of all
+        shards are disjoint and cover 0..n_tasks-1 in order.
+    """
+    if shard is None:
+        return range(n_tasks)
+    index, count = shard
+    start = index * n_tasks // count
+    stop = (index + 1) * n_tasks // count
+    return range(start, stop)
+
+
+def shard_path(path, shard=None):
+    """
+    Output path for one shard, e.g.
+    results/raw/simulation_opt.shard-1-of-4.csv
+    """
+    if shard is None:
+        return path
+    root, ext = os.path.splitext(path)
+    index, count = shard
+    return f"{root}.shard-{index}-of-{count}{ext}"
+
+
+def merge_shards(path, count):
+    """
+    Concatenate shard outputs into the single-node result file.
+
+    Parameters
+    ----------
+    path : str
+        Path the single-node run would write.
+    count : int
+        Number of shards (N).
+
+    Returns
+    -------
+    pd.DataFrame
+        Merged results, also written to `path`.
+    """
+    parts = [shard_path(path, (i, count)) for i in range(count)]
+    missing = [p for p in parts if not os.path.exists(p)]
+    if missing:
+        raise FileNotFoundError(f"missing shard outputs: {missing}")
+
+    # Shards format every value exactly as a single node would,
+    # so a textual concatenation is byte-identical to that run
+    header = None
+    with open(path, "w") as out:
+        for p in parts:
+            with open(p) as f:
+                first = f.readline()
+                if not first.strip():
+                    # More shards than tasks: this shard had nothing to do
+                    continue
+                if header is None:
+                    header = first
+                    out.write(header)
+                elif first != header:
+                    raise ValueError(f"shard {p} has a different header")
+                for line in f:
+                    out.write(line)
+
+    # Read counts back as the compact type the drivers wrote
+    return read_counts_csv(path)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    merge = sub.add_parser("merge", help="Merge shard outputs.")
+    merge.add_argument("path",
+                       help="Single-node output path, e.g. "
+                            "results/raw/simulation_opt.csv")
+    merge.add_argument("--count", type=int, required=True,
+                       help="Number of shards (N).")
+    args = parser.parse_args()
+
+    df = merge_shards(args.path, args.count)
+    print(f"Merged {args.count} shards ({len(df)} rows) into {args.path}")
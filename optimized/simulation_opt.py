@@ -3,143 +3,181 @@ simulation_opt.py
 ----------------------------------------------
 Optimized (vectorized) simulation for BH (1995)
 FDR estimation study. Uses NumPy to eliminate
-most Python loops.
+most Python loops. The per-replicate kernels are
+in kernels.py; finished batches are written by the
+pipeline in pipeline.py while the next one runs.
 
 Author: Dili K. Maduabum
 Last edit: November 2025
 """
 
-import numpy as np
-import pandas as pd
-from scipy.stats import norm
+import os
+
+# Compute kernels live in the import-light kernels module;
+# they are re-exported here for existing callers.
+try:
+    from optimized.kernels import (
+        generate_pvalues_vectorized,
+        benjamini_hochberg_vectorized,
+        run_single_sim_opt,
+        run_batch_opt,
+        replicate_seed,
+        read_counts_csv,
+        TESTS,
+    )
+    from optimized.pipeline import iter_tasks, run_pipeline
+    from optimized.sharding import parse_shard, shard_path
+    from optimized.tail_metrics import TailMetrics, write_tails
+    from optimized.variance_reduction import estimate_condition_vr
+except ImportError:
+    from kernels import (
+        generate_pvalues_vectorized,
+        benjamini_hochberg_vectorized,
+        run_single_sim_opt,
+        run_batch_opt,
+        replicate_seed,
+        read_counts_csv,
+        TESTS,
+    )
+    from pipeline import iter_tasks, run_pipeline
+    from sharding import parse_shard, shard_path
+    from tail_metrics import TailMetrics, write_tails
+    from variance_reduction import estimate_condition_vr
+
+
+SEED = 1000  # Base seed; replicate streams are keyed on (condition, rep)
+
+CONDITIONS = [
+    (100, 0.8, 2.5),
+    (500, 0.8, 2.5),
+    (1000, 0.8, 2.5)
+]
 
 
 # -------------------------------------------------------
-# Vectorized Data Generation
+# Full Optimized Simulation Study
 # -------------------------------------------------------
 
-def generate_pvalues_vectorized(m, pi0, effect_size, seed=None):
+def run_simulation_opt(nsim=1000, shard=None, n_obs=None, test="welch",
+                       return_df=True, approx=False):
     """
-    Vectorized p-value generation.
-
-    Under null: X ~ N(0,1)
-    Under alt:  X ~ N(effect_size, 1)
-
-    Returns
-    -------
-    pvals : np.ndarray  shape (m,)
-    is_null : np.ndarray bool mask
-    """
-    if seed is not None:
-        np.random.seed(seed)
-
-    m0 = int(m * pi0)
-    m1 = m - m0
-
-    # Single vector of z-values
-    z = np.empty(m)
-    z[:m0] = np.random.normal(0, 1, m0)
-    z[m0:] = np.random.normal(effect_size, 1, m1)
-
-    pvals = 2 * (1 - norm.cdf(np.abs(z)))
-
-    is_null = np.zeros(m, dtype=bool)
-    is_null[:m0] = True
-
-    return pvals, is_null
-
-
-# -------------------------------------------------------
-# Vectorized BH FDR Procedure
-# -------------------------------------------------------
+    Run a small optimized simulation study.
 
-def benjamini_hochberg_vectorized(pvals, alpha=0.05):
-    """
-    Fully vectorized BH procedure.
+    FDP and power histograms (see tail_metrics.py) are updated
+    as batches are written and saved next to the results.
+
+    Parameters
+    ----------
+    nsim : int
+        Replicates per condition.
+    shard : tuple (index, count) or None
+        Run only this shard's block of the (condition, replicate)
+        space and write it to a shard file (see sharding.py).
+    n_obs : int or None
+        Observations per group for raw-data p-values;
+        None uses z-scores.
+    test : str
+        "welch", "student" or "permutation", used when n_obs
+        is given.
+    return_df : bool
+        Read the written file back and return it. Large sweeps
+        can pass False to keep memory bounded.
+    approx : bool
+        Use the one-pass sketch cutoff instead of exact BH
+        (see sketch.py); the results gain the bound columns
+        R_lo and R_hi on the exact BH count.
 
     Returns
     -------
-    rejected : boolean array
+    pd.DataFrame or None
     """
-    m = len(pvals)
-    order = np.argsort(pvals)
-    ordered_p = pvals[order]
-
-    thresholds = (np.arange(1, m+1) / m) * alpha
-    passed = ordered_p <= thresholds
+    out_path = shard_path("results/raw/simulation_opt.csv", shard)
 
-    if not np.any(passed):
-        return np.zeros(m, dtype=bool)
+    print("Running optimized (vectorized) simulation...")
 
-    k = np.max(np.where(passed))
-    cutoff = ordered_p[k]
+    # Batches in flat task order t <-> (condition t // nsim, rep t % nsim)
+    batches = (
+        run_batch_opt(m, pi0, eff, 0.05, SEED, c, reps, n_obs, test, approx)
+        for c, (m, pi0, eff), reps in iter_tasks(CONDITIONS, nsim,
+                                                 shard=shard)
+    )
+    tails = TailMetrics()
+    run_pipeline(batches, out_path, on_batch=tails.update_records)
+    write_tails(tails, "results/raw/simulation_opt_tails.csv", shard)
 
-    return pvals <= cutoff
+    print(f"Optimized simulation complete. Results saved to {out_path}")
+    return read_counts_csv(out_path) if return_df else None
 
 
 # -------------------------------------------------------
-# Optimized Single Simulation
+# Variance-Reduced Simulation Study
 # -------------------------------------------------------
 
-def run_single_sim_opt(m, pi0, effect_size, alpha=0.05, seed=None):
+def run_simulation_vr(nsim=1000, antithetic=True, control_variates=True):
     """
-    Run a single optimized simulation replicate.
+    Estimate BH FDR and power per condition with variance
+    reduction (see variance_reduction.py).
+
+    One row per condition, with each estimate's standard
+    error, the naive standard error from the same replicates
+    and the effective-sample-size gain: a plain Monte Carlo
+    run needs ess_gain times as many replicates for the same
+    confidence-interval width.
     """
-    pvals, is_null = generate_pvalues_vectorized(m, pi0, effect_size, seed)
-
-    rejected = benjamini_hochberg_vectorized(pvals, alpha)
-
-    v = np.sum(rejected & is_null)
-    r = np.sum(rejected)
-    fdr_hat = v / r if r > 0 else 0
-
-    tpr = np.sum(rejected & ~is_null) / np.sum(~is_null)
-
-    return {
-        "m": m,
-        "pi0": pi0,
-        "effect_size": effect_size,
-        "alpha": alpha,
-        "fdr": fdr_hat,
-        "tpr": tpr,
-        "r": r
-    }
+    print("Running variance-reduced simulation...")
 
-
-# -------------------------------------------------------
-# Full Optimized Simulation Study
-# -------------------------------------------------------
-
-def run_simulation_opt():
-    """
-    Run a small optimized simulation study.
-    """
-    conditions = [
-        (100, 0.8, 2.5),
-        (500, 0.8, 2.5),
-        (1000, 0.8, 2.5)
+    rows = [
+        estimate_condition_vr(m, pi0, eff, 0.05, nsim, SEED, c,
+                              antithetic, control_variates)
+        for c, (m, pi0, eff) in enumerate(CONDITIONS)
     ]
 
-    nsim = 1000
-    all_results = []
+    import pandas as pd
 
-    print("Running optimized (vectorized) simulation...")
-
-    for m, pi0, eff in conditions:
-        for i in range(nsim):
-            seed = 1000 + i
-            res = run_single_sim_opt(m, pi0, eff, 0.05, seed)
-            all_results.append(res)
+    df = pd.DataFrame(rows)
 
-    df = pd.DataFrame(all_results)
-
-    import os
     os.makedirs("results/raw", exist_ok=True)
-    df.to_csv("results/raw/simulation_opt.csv", index=False)
+    out_path = "results/raw/simulation_vr.csv"
+    df.to_csv(out_path, index=False)
 
-    print("Optimized simulation complete.")
+    for row in rows:
+        print(f"m={row['m']:5d}  "
+              f"FDR {row['FDR']:.4f} (ESS x{row['FDR_ess_gain']:.1f})  "
+              f"Power {row['Power']:.4f} (ESS x{row['Power_ess_gain']:.1f})")
+    print(f"Variance-reduced simulation complete. Results saved to {out_path}")
+    return df
 
 
 if __name__ == "__main__":
-    run_simulation_opt()
-
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--nsim", type=int, default=1000,
+                        help="Replicates per condition.")
+    parser.add_argument("--shard", type=parse_shard, default=None,
+                        help="Run shard i of N, given as i/N.")
+    parser.add_argument("--n-obs", type=int, default=None,
+                        help="Per-group sample size: two-sample test "
+                             "p-values from raw data instead of z-scores.")
+    parser.add_argument("--test", choices=TESTS, default=None,
+                        help="Test used with --n-obs (default: welch).")
+    parser.add_argument("--approx", action="store_true",
+                        help="Approximate BH from a one-pass p-value "
+                             "sketch instead of a sort.")
+    parser.add_argument("--vr", action="store_true",
+                        help="Variance-reduced per-condition estimates.")
+    parser.add_argument("--no-antithetic", action="store_true",
+                        help="With --vr: control variates only.")
+    args = parser.parse_args()
+
+    if args.test is not None and args.n_obs is None:
+        parser.error("--test needs --n-obs; z-score p-values use no test")
+
+    if args.vr:
+        if args.shard is not None:
+            parser.error("--vr runs on a single node; drop --shard")
+        run_simulation_vr(args.nsim, antithetic=not args.no_antithetic)
+    else:
+        run_simulation_opt(args.nsim, args.shard, args.n_obs,
+                           args.test or "welch",
+                           return_df=False, approx=args.approx)
@@ -0,0 +1,268 @@
+"""
+tail_metrics.py
+----------------------------------------------
+Streaming FDP and power distributions: quantiles and
+exceedance probabilities such as P(FDP > 0.1) per
+method and condition, without keeping every
+replicate's FDP.
+
+FDP = V / R and power = S / m1 are ratios of integer
+counts, so each one is binned exactly with integer
+arithmetic on a grid of width 1 / BINS: bin 0 holds
+the value 0 and bin k > 0 holds ((k-1) / BINS, k / BINS].
+Every reported quantile is the upper edge of its bin,
+so it is within 1 / BINS above the empirical quantile,
+and P(X > gamma) is exact whenever gamma lies on the
+grid (an upper bound otherwise). Histograms of the same
+grid add, so workers and shards can each keep their own
+and merge.
+
+Usage:
+    python optimized/tail_metrics.py summary \\
+        results/raw/simulation_opt_tails.shard-*.npz
+    python optimized/tail_metrics.py csv results/raw/simulation_results.csv
+
+Author: Dili K. Maduabum
+Last edit: November 2025
+"""
+
+import json
+import os
+
+import numpy as np
+
+try:
+    from optimized.kernels import COUNT_COLUMNS
+    from optimized.sharding import shard_path
+except ImportError:
+    from kernels import COUNT_COLUMNS
+    from sharding import shard_path
+
+
+BINS = 1000
+GROUP_COLS = ("method", "m", "pi0", "effect_size", "alpha")
+QUANTILES = (0.5, 0.95)
+GAMMAS = (0.05, 0.1, 0.2)
+
+
+class ProportionHistogram:
+    """
+    Histogram of proportions num / den on a 1 / bins grid
+    (num / 0 is taken as 0, as in baseline.metrics).
+    """
+
+    def __init__(self, bins=BINS):
+        self.bins = bins
+        self.counts = np.zeros(bins + 1, dtype=np.int64)
+
+    @property
+    def n(self):
+        return int(self.counts.sum())
+
+    def update(self, num, den):
+        """
+        Add a chunk of replicates given their integer counts.
+        """
+        num = np.asarray(num, dtype=np.int64)
+        den = np.asarray(den, dtype=np.int64)
+        # ceil(num * bins / den) without floating-point rounding
+        idx = np.where(den > 0, -(-num * self.bins // np.maximum(den, 1)), 0)
+        self.counts += np.bincount(idx, minlength=self.bins + 1)
+        return self
+
+    def merge(self, other):
+        """
+        Add another histogram's counts (same grid required).
+        """
+        if self.bins != other.bins:
+            raise ValueError("cannot merge histograms with different bins")
+        self.counts += other.counts
+        return self
+
+    def quantile(self, q):
+        """
+        Upper bin edge of the rank-ceil(q n) value (nan when empty).
+        """
+        n = self.n
+        if n == 0:
+            return np.nan
+        rank = max(1, int(np.ceil(q * n)))
+        k = int(np.searchsorted(np.cumsum(self.counts), rank))
+        return k / self.bins
+
+    def exceedance(self, gamma):
+        """
+        Fraction of replicates with a value > gamma (nan when empty).
+        """
+        n = self.n
+        if n == 0:
+            return np.nan
+        # Bins above j hold values > j / bins >= gamma
+        j = int(np.floor(gamma * self.bins + 1e-9))
+        return self.counts[j + 1:].sum() / n
+
+
+class TailMetrics:
+    """
+    FDP and power histograms for every group of result records.
+
+    Records are the dicts the drivers write (condition columns
+    plus the counts V, R, S, m1); a group is one combination of
+    the GROUP_COLS present in them.
+    """
+
+    def __init__(self, bins=BINS):
+        self.bins = bins
+        self.group_cols = None
+        self.groups = {}    # key -> (FDP histogram, power histogram)
+
+    def _hists(self, key):
+        if key not in self.groups:
+            self.groups[key] = (ProportionHistogram(self.bins),
+                                ProportionHistogram(self.bins))
+        return self.groups[key]
+
+    def update_records(self, records):
+        """
+        Add a batch of result records.
+        """
+        if not records:
+            return self
+        if self.group_cols is None:
+            self.group_cols = tuple(c for c in GROUP_COLS if c in records[0])
+
+        rows = {}
+        for i, rec in enumerate(records):
+            key = tuple(rec[c] for c in self.group_cols)
+            rows.setdefault(key, []).append(i)
+
+        counts = np.array([[rec[c] for c in COUNT_COLUMNS]
+                           for rec in records], dtype=np.int64)
+        for key, idx in rows.items():
+            v, r, s, m1 = counts[idx].T
+            fdp, power = self._hists(key)
+            fdp.update(v, r)
+            power.update(s, m1)
+        return self
+
+    def merge(self, other):
+        """
+        Add another TailMetrics' histograms.
+        """
+        if other.group_cols is None:
+            return self
+        if self.group_cols is None:
+            self.group_cols = other.group_cols
+        elif self.group_cols != other.group_cols:
+            raise ValueError("cannot merge tail metrics of different groups")
+        for key, (fdp, power) in other.groups.items():
+            mine = self._hists(key)
+            mine[0].merge(fdp)
+            mine[1].merge(power)
+        return self
+
+    def summary(self, quantiles=QUANTILES, gammas=GAMMAS):
+        """
+        One row per group: n, FDP and power quantiles, and
+        P(FDP > gamma) for each gamma.
+
+        Returns
+        -------
+        list of dict
+        """
+        rows = []
+        for key, (fdp, power) in self.groups.items():
+            row = dict(zip(self.group_cols, key))
+            row["n"] = fdp.n
+            for q in quantiles:
+                row[f"FDP_q{round(100 * q):02d}"] = fdp.quantile(q)
+            for g in gammas:
+                row[f"P(FDP>{g})"] = fdp.exceedance(g)
+            for q in quantiles:
+                row[f"Power_q{round(100 * q):02d}"] = power.quantile(q)
+            rows.append(row)
+        return rows
+
+    # ---------------------------------------------------
+    # Persistence
+    # ---------------------------------------------------
+
+    def save(self, path):
+        keys = list(self.groups)
+        counts = np.array([[h.counts for h in self.groups[k]] for k in keys],
+                          dtype=np.int64).reshape(len(keys), 2, self.bins + 1)
+        meta = {
+            "group_cols": self.group_cols,
+            "keys": [[v.item() if hasattr(v, "item") else v for v in k]
+                     for k in keys],
+        }
+        np.savez(path, counts=counts, bins=self.bins, meta=json.dumps(meta))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            tails = cls(int(data["bins"]))
+            meta = json.loads(str(data["meta"]))
+            counts = data["counts"]
+        if meta["group_cols"] is not None:
+            tails.group_cols = tuple(meta["group_cols"])
+        for key, (fdp, power) in zip(meta["keys"], counts):
+            hists = tails._hists(tuple(key))
+            hists[0].counts += fdp
+            hists[1].counts += power
+        return tails
+
+
+def write_tails(tails, path, shard=None):
+    """
+    Save a driver's histograms (per shard) and, for a
+    single-node run, their summary as a CSV next to them.
+
+    Parameters
+    ----------
+    path : str
+        Single-node summary path, e.g.
+        results/raw/simulation_opt_tails.csv; the histograms
+        go to the same path with an .npz extension.
+    """
+    root, _ = os.path.splitext(path)
+    tails.save(shard_path(root + ".npz", shard))
+    if shard is None:
+        import pandas as pd
+
+        pd.DataFrame(tails.summary()).to_csv(path, index=False)
+
+
+if __name__ == "__main__":
+    import argparse
+    import pandas as pd
+
+    parser = argparse.ArgumentParser()
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    summary = sub.add_parser("summary",
+                             help="Merge saved histograms and print "
+                                  "the tail metrics.")
+    summary.add_argument("paths", nargs="+", help="Histogram files (.npz).")
+
+    from_csv = sub.add_parser("csv",
+                              help="Tail metrics of a results CSV, read "
+                                   "in chunks.")
+    from_csv.add_argument("path")
+    from_csv.add_argument("--chunksize", type=int, default=100_000)
+    args = parser.parse_args()
+
+    tails = TailMetrics()
+    if args.command == "summary":
+        for p in args.paths:
+            tails.merge(TailMetrics.load(p))
+    else:
+        header = pd.read_csv(args.path, nrows=0).columns
+        if not set(COUNT_COLUMNS) <= set(header):
+            parser.error(f"{args.path} has no count columns "
+                         f"{COUNT_COLUMNS}; "
+                         "rerun the driver that wrote it")
+        for chunk in pd.read_csv(args.path, chunksize=args.chunksize):
+            tails.update_records(chunk.to_dict("records"))
+
+    print(pd.DataFrame(tails.summary()).to_string(index=False))
@@ -0,0 +1,108 @@
+"""
+import_benchmark.py
+---------------------------------
+Measure module import time in fresh interpreters.
+
+Every loky worker pays the import cost of the kernel
+module before it runs its first replicate, so this
+script times each simulation module in a clean Python
+process and asserts that
+1. the compute-only modules never load pandas,
+   matplotlib or seaborn, and
+2. importing the kernels stays within IMPORT_BUDGET
+   and is cheaper than the pandas + scipy.stats
+   imports the optimized module used to pay.
+
+Results are written to results/raw/import_times.csv
+
+Author: Dili K. Maduabum
+Last edit: November 2025
+"""
+
+import os
+import subprocess
+import sys
+
+
+# Modules a parallel worker (or a cheap import) must not pull in
+HEAVY = ("pandas", "matplotlib", "seaborn", "tqdm")
+
+# Modules that must stay free of HEAVY imports
+LEAN = [
+    "optimized.kernels",
+    "optimized.simulation_opt",
+    "optimized.parallel_simulation",
+    "baseline.simulation",
+    "baseline.visualize",
+]
+
+# Timed for reference only. "pandas, scipy.stats" is what the
+# optimized module imported before the kernels were split out.
+LEGACY = "pandas, scipy.stats"
+REFERENCE = [LEGACY]
+
+IMPORT_BUDGET = 1.0   # seconds, generous for slow CI machines
+N_REPEAT = 5
+
+PROBE = """
+import sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+heavy = [h for h in {heavy!r} if h in sys.modules]
+print(elapsed, ",".join(heavy))
+"""
+
+
+def time_import(module, n_repeat=N_REPEAT):
+    """
+    Import `module` in n_repeat fresh interpreters.
+
+    Returns
+    -------
+    (float, list of str)
+        Best-of-n import time in seconds, and the HEAVY
+        modules that were loaded as a side effect.
+    """
+    env = dict(os.environ, PYTHONPATH=os.getcwd())
+    times = []
+    heavy = []
+    for _ in range(n_repeat):
+        out = subprocess.run(
+            [sys.executable, "-c", PROBE.format(module=module, heavy=HEAVY)],
+            capture_output=True, text=True, check=True, env=env
+        ).stdout.split()
+        times.append(float(out[0]))
+        heavy = out[1].split(",") if len(out) > 1 else []
+    return min(times), heavy
+
+
+def main():
+    rows = []
+    print("Timing imports in fresh interpreters...\n")
+
+    for module in LEAN + REFERENCE:
+        t, heavy = time_import(module)
+        rows.append((module, t, ";".join(heavy)))
+        print(f"{module:35s} {t:.3f} sec  heavy: {heavy or '-'}")
+
+    os.makedirs("results/raw", exist_ok=True)
+    with open("results/raw/import_times.csv", "w") as f:
+        f.write("module,seconds,heavy_modules\n")
+        for module, t, heavy in rows:
+            f.write(f"\"{module}\",{t:.6f},{heavy}\n")
+
+    times = {module: t for module, t, _ in rows}
+    for module, _, heavy in rows:
+        if module in LEAN:
+            assert not heavy, f"{module} imports {heavy}"
+    assert times["optimized.kernels"] < IMPORT_BUDGET, \
+        f"optimized.kernels took {times['optimized.kernels']:.3f} sec"
+    assert times["optimized.kernels"] < times[LEGACY], \
+        "optimized.kernels imports slower than pandas + scipy.stats"
+
+    print("\nImport checks passed. Saved results/raw/import_times.csv")
+
+
+if __name__ == "__main__":
+    main()
@@ -27,8 +27,12 @@ import matplotlib.pyplot as plt
 # CPU core counts to test
 CORES = [1, 2, 4, 8]
 
+# Fixed backend: "auto" would time its calibration probe and
+# could pick the serial path, hiding the parallel scaling
+BACKEND = "processes"
 
-def run_parallel(n_cores, nsim=500):
+
+def run_parallel(n_cores, nsim=500, backend=BACKEND):
     """
     Run the optimized parallel simulation using a specific number of cores.
 
@@ -38,13 +42,16 @@ def run_parallel(n_cores, nsim=500):
         Number of CPU cores for joblib.Parallel.
     nsim : int
         Number of replicates per condition in the simulation.
+    backend : str
+        Backend passed to the driver ("processes" or "threads").
 
     Returns
     -------
     float
         Wall-clock runtime in seconds.
     """
-    cmd = f"python optimized/parallel_simulation.py --cores {n_cores} --nsim {nsim}"
+    cmd = (f"python optimized/parallel_simulation.py --cores {n_cores} "
+           f"--nsim {nsim} --backend {backend}")
     start = time.time()
     subprocess.run(cmd, shell=True)
     end = time.time()
@@ -0,0 +1,343 @@
+"""
+test_engines.py
+Tests for the alternative engines that sit next to the
+Monte Carlo simulation (analytic reference values, ...).
+
+Author: Dili K. Maduabum
+Last edit: November 2025
+"""
+
+import os, sys
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+import numpy as np
+from optimized.analytic import (
+    alt_pvalue_cdf, analytic_cell, rejection_distribution, step_up_distribution
+)
+from optimized.kernels import (
+    benjamini_hochberg_batch, benjamini_hochberg_vectorized, run_batch_opt
+)
+from baseline.methods import bh_procedure, local_fdr_method
+from baseline.summary import bootstrap_group_means, summarize
+from optimized.incremental_bh import IncrementalBH
+from optimized.design import solve_design
+from optimized.sketch import PValueSketch, merge_sketches
+from optimized.tail_metrics import TailMetrics
+from optimized.online_fdr import PROCEDURES, OnlineProcedure, gamma_lord
+from optimized.variance_reduction import estimate_condition_vr, simulate_counts
+
+
+def test_analytic_bh_fdr_identity():
+    """
+    The leave-one-out recursion must reproduce E[FDR] = m0/m * alpha
+    exactly, and the distribution of R must sum to one.
+    """
+    m, pi0, eff, alpha = 40, 0.75, 2.0, 0.1
+    m0 = int(m * pi0)
+    crit = alpha * np.arange(1, m + 1) / m
+
+    others = step_up_distribution(crit[1:], m0 - 1, lambda t: t,
+                                  m - m0, lambda t: alt_pvalue_cdf(t, eff))
+    fdr = m0 * np.sum(crit / np.arange(1, m + 1) * others)
+
+    assert abs(fdr - m0 / m * alpha) < 1e-12
+    for labels in ("fixed", "random"):
+        pmf = rejection_distribution(m, pi0, eff, alpha, labels)
+        assert abs(pmf.sum() - 1) < 1e-10
+        assert np.all(pmf >= 0)
+
+
+def test_analytic_matches_monte_carlo():
+    """
+    Monte Carlo BH power and FDR agree with the analytic values
+    within four standard errors.
+    """
+    m, pi0, eff, alpha, nsim = 100, 0.8, 2.5, 0.05, 4000
+    out = run_batch_opt(m, pi0, eff, alpha, 11, 0, range(nsim))
+    tpr = np.array([r["S"] / r["m1"] for r in out])
+    fdr = np.array([r["V"] / max(r["R"], 1) for r in out])
+
+    exact = analytic_cell(m, pi0, eff, alpha)["BH"]
+
+    assert abs(tpr.mean() - exact["Power"]) < 4 * tpr.std() / np.sqrt(nsim)
+    assert abs(fdr.mean() - exact["FDR"]) < 4 * fdr.std() / np.sqrt(nsim)
+
+
+def test_batch_bh_matches_vectorized():
+    """
+    Row-wise batch BH equals the single-vector procedure, and the
+    variance-reduction counts equal those of the plain replicates.
+    """
+    rng = np.random.default_rng(3)
+    pvals = rng.uniform(size=(50, 30)) ** 3
+    batch = benjamini_hochberg_batch(pvals, 0.1)
+    for row, rej in zip(pvals, batch):
+        assert np.array_equal(rej, benjamini_hochberg_vectorized(row, 0.1))
+
+    counts = simulate_counts(100, 0.8, 2.5, 0.05, 5, 0, np.arange(20))
+    plain = run_batch_opt(100, 0.8, 2.5, 0.05, 5, 0, range(20))
+    assert np.array_equal(counts["V_BH"] + counts["S_BH"],
+                          [r["R"] for r in plain])
+
+
+def test_variance_reduction_is_unbiased_and_gains():
+    """
+    Antithetic + control-variate estimates agree with the analytic
+    values within four of their standard errors, and cut the
+    variance of the power estimate.
+    """
+    m, pi0, eff, alpha = 100, 0.8, 2.5, 0.05
+    res = estimate_condition_vr(m, pi0, eff, alpha, 2000, 11, 0)
+    exact = analytic_cell(m, pi0, eff, alpha)["BH"]
+
+    assert abs(res["FDR"] - exact["FDR"]) < 4 * res["FDR_se"]
+    assert abs(res["Power"] - exact["Power"]) < 4 * res["Power_se"]
+    assert res["Power_ess_gain"] > 2
+
+
+def test_bootstrap_resamples_within_groups():
+    """
+    Every resample draws only from its own group: with groups of
+    constant values the bootstrap means are exactly those values,
+    and the percentile CI brackets the group mean.
+    """
+    codes = np.repeat([2, 0, 1], [5, 7, 3])
+    values = codes.astype(float) * 10
+    boot = bootstrap_group_means(values, codes, n_boot=50)
+    assert boot.shape == (50, 3, 1)
+    assert np.all(boot[:, :, 0] == [0, 10, 20])
+
+    import pandas as pd
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({"method": np.repeat(["A", "B"], 200),
+                       "FDR": rng.uniform(size=400),
+                       "Power": rng.uniform(size=400)})
+    out = summarize(df, group_cols=["method"], n_boot=500)
+    assert np.all(out["FDR_ci_lo"] < out["FDR_mean"])
+    assert np.all(out["FDR_mean"] < out["FDR_ci_hi"])
+
+
+def test_online_batches_match_one_at_a_time():
+    """
+    Chunked online testing makes the same decisions as testing one
+    p-value at a time, LORD++ matches its defining formula, and an
+    incomplete procedure fails when it is created.
+    """
+    rng = np.random.default_rng(4)
+    pvals = rng.uniform(size=400)
+    signal = rng.random(400) < 0.3
+    pvals[signal] = pvals[signal] ** 8
+
+    for cls in PROCEDURES.values():
+        single = cls(0.1)
+        one_by_one = np.array([single.test(p) for p in pvals])
+        for chunk in (7, 400):
+            proc = cls(0.1)
+            batched = np.concatenate([proc.test_batch(pvals[i:i + chunk])
+                                      for i in range(0, 400, chunk)])
+            assert np.array_equal(batched, one_by_one)
+        assert one_by_one.any()
+
+    alpha, w0, taus, expected = 0.1, 0.05, [], []
+    for t, p in enumerate(pvals, start=1):
+        level = w0 * gamma_lord(t) + sum(
+            (alpha - w0 if j == 0 else alpha) * gamma_lord(t - tau)
+            for j, tau in enumerate(taus))
+        expected.append(p <= level)
+        if p <= level:
+            taus.append(t)
+    proc = PROCEDURES["LORD++"](alpha)
+    assert np.array_equal(proc.test_batch(pvals), expected)
+
+    # A procedure without its level updates cannot be created
+    class NoUpdate(OnlineProcedure):
+        def _levels(self, t):
+            return np.full(len(t), 0.01)
+    try:
+        NoUpdate()
+    except TypeError:
+        pass
+    else:
+        raise AssertionError("incomplete procedure was instantiated")
+
+
+def test_incremental_bh_tracks_full_recompute():
+    """
+    After every insert, delete and update the incremental structure
+    rejects exactly what a full BH pass rejects, and reports the
+    flipped ids.
+    """
+    rng = np.random.default_rng(5)
+    pvals = np.round(rng.uniform(size=300) ** 4, 3)   # ties included
+    current = dict(enumerate(pvals))
+    inc = IncrementalBH(pvals, alpha=0.1, block_size=8)
+
+    def full():
+        ids = np.array(list(current))
+        rej = benjamini_hochberg_vectorized(
+            np.array([current[i] for i in ids]), 0.1)
+        return set(ids[rej].tolist())
+
+    before = full()
+    for step in range(400):
+        p = round(rng.uniform() ** 4, 3)
+        if step % 3 == 0:
+            _, up, down = inc.insert(1000 + step, p)
+            current[1000 + step] = p
+        else:
+            i = int(rng.choice(list(current)))
+            if step % 3 == 1:
+                _, up, down = inc.delete(i)
+                del current[i]
+            else:
+                _, up, down = inc.update(i, p)
+                current[i] = p
+
+        after = full()
+        assert set(inc.rejected_ids().tolist()) == after
+        assert set(up.tolist()) == after - before
+        assert set(down.tolist()) == (before - after) & set(current)
+        before = after
+
+
+def test_sketch_bounds_contain_exact_bh():
+    """
+    Merged shard sketches bracket the exact BH rejection count, and
+    the approximate cutoff, from any BH entry point, only rejects
+    BH rejections; approximate replicates record the bounds.
+    """
+    rng = np.random.default_rng(6)
+    for exponent in (1, 4, 20):
+        pvals = rng.uniform(size=5000) ** exponent
+        exact = benjamini_hochberg_vectorized(pvals, 0.1)
+
+        shards = [PValueSketch.from_pvalues(part, bins_per_decade=10)
+                  for part in np.array_split(pvals, 3)]
+        bounds = merge_sketches(shards).bh_bounds(0.1)
+        assert bounds["R_lo"] <= exact.sum() <= bounds["R_hi"]
+
+        approx = benjamini_hochberg_vectorized(pvals, 0.1, approx=True)
+        assert approx.sum() >= bounds["R_lo"]
+        assert not np.any(approx & ~exact)
+        assert np.array_equal(bh_procedure(pvals, 0.1, approx=True), approx)
+        _, own = benjamini_hochberg_vectorized(pvals, 0.1, approx=True,
+                                               return_bounds=True)
+        assert own["R_lo"] <= exact.sum() <= own["R_hi"]
+
+    # The replicate runners select the same cutoff
+    exact = run_batch_opt(2000, 0.8, 3.0, 0.1, 4, 0, range(5))
+    approx = run_batch_opt(2000, 0.8, 3.0, 0.1, 4, 0, range(5), approx=True)
+    for e, a in zip(exact, approx):
+        assert a["R"] <= e["R"] and a["V"] <= e["V"] and a["R"] > 0
+        assert a["R_lo"] <= a["R"] and a["R_lo"] <= e["R"] <= a["R_hi"]
+        assert "R_lo" not in e
+
+
+def test_design_solver_hits_target_power():
+    """
+    The effect size solved for 50% BH power, and the m solved for
+    50% Bonferroni power, have exact (analytic) power within a few
+    standard errors of the target.
+    """
+    res = solve_design(0.5, m=100, pi0=0.8, nsim=400, bracket=(0.0, 5.0))
+    exact = analytic_cell(100, 0.8, res["value"], 0.05)["BH"]["Power"]
+
+    assert abs(exact - 0.5) < 4 * res["metric_se"]
+    assert res["ci_lo"] < res["value"] < res["ci_hi"]
+
+    # Solving for m on its default bracket: Bonferroni power falls
+    # with m, and exactly so through its alpha / m threshold
+    res = solve_design(0.5, parameter="m", method="Bonferroni",
+                       effect_size=3.5, pi0=0.8, nsim=400)
+    exact = alt_pvalue_cdf(0.05 / res["value"], 3.5)
+    assert isinstance(res["value"], int) and res["value"] > 10
+    assert abs(exact - 0.5) < 4 * res["metric_se"] + 0.01
+
+    try:
+        solve_design(0.5, parameter="m", bracket=(0, 100))
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("m bracket starting at 0 was accepted")
+    assert res["n_evals"] < 30
+
+
+def test_tail_metrics_match_stored_fdps():
+    """
+    Histograms merged from two workers give the empirical FDP
+    quantiles to within one bin, exact P(FDP > gamma) on the grid,
+    and survive a save/load round trip.
+    """
+    import tempfile
+    from baseline.metrics import fdr_from_counts
+
+    records = (run_batch_opt(50, 0.5, 1.0, 0.2, 8, 0, range(300))
+               + run_batch_opt(200, 0.8, 2.0, 0.1, 8, 1, range(300)))
+    halves = [TailMetrics().update_records(records[i::2]) for i in (0, 1)]
+    tails = halves[0].merge(halves[1])
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "tails.npz")
+        tails.save(path)
+        loaded = TailMetrics.load(path)
+
+    for row, again in zip(tails.summary(), loaded.summary()):
+        assert row == again
+        sub = [r for r in records if r["m"] == row["m"]]
+        fdp = fdr_from_counts([r["V"] for r in sub], [r["R"] for r in sub])
+
+        assert row["n"] == 300
+        q95 = np.quantile(fdp, 0.95, method="inverted_cdf")
+        assert q95 <= row["FDP_q95"] < q95 + 1e-3 + 1e-12
+        for g in (0.05, 0.1, 0.2):
+            assert row[f"P(FDP>{g})"] == np.mean(fdp > g)
+
+
+def test_local_fdr_controls_fdr():
+    """
+    The FFT-binned local fdr method keeps the mean FDP near alpha
+    with power comparable to BH, and rejects almost nothing when
+    every hypothesis is null. Nothing with p > 0.5 is rejected.
+    """
+    from baseline.metrics import compute_counts
+    from optimized.kernels import generate_pvalues_vectorized, replicate_seed
+
+    fdp, power, bh_power = [], [], []
+    for r in range(200):
+        pvals, is_null = generate_pvalues_vectorized(
+            1000, 0.8, 2.5, replicate_seed(9, 0, r))
+        rejects = local_fdr_method(pvals, 0.1)
+        assert not np.any(rejects & (pvals > 0.5))
+        counts = compute_counts(rejects, is_null)
+        fdp.append(counts["V"] / max(counts["R"], 1))
+        power.append(counts["S"] / counts["m1"])
+        bh_power.append(np.mean(bh_procedure(pvals, 0.1)[~is_null]))
+
+    assert np.mean(fdp) < 0.1 + 0.02
+    assert np.mean(power) > 0.9 * np.mean(bh_power)
+
+    null = np.random.default_rng(2).uniform(size=(50, 2000))
+    rejects = [local_fdr_method(p, 0.1) for p in null]
+    assert np.mean([r.any() for r in rejects]) < 0.2
+    assert not any(np.any(r & (p > 0.5)) for r, p in zip(rejects, null))
+
+    # Large m: the left tail of the smoothed density is heaviest here
+    pvals, _ = generate_pvalues_vectorized(2_000_000, 0.95, 3.0, 5)
+    assert not np.any(local_fdr_method(pvals, 0.1) & (pvals > 0.5))
+    assert list(local_fdr_method([0.0, 1.0, 1e-300], 0.1)) == \
+        [True, False, True]
+
+
+if __name__ == "__main__":
+    test_analytic_bh_fdr_identity()
+    test_analytic_matches_monte_carlo()
+    test_batch_bh_matches_vectorized()
+    test_variance_reduction_is_unbiased_and_gains()
+    test_bootstrap_resamples_within_groups()
+    test_online_batches_match_one_at_a_time()
+    test_incremental_bh_tracks_full_recompute()
+    test_sketch_bounds_contain_exact_bh()
+    test_design_solver_hits_target_power()
+    test_tail_metrics_match_stored_fdps()
+    test_local_fdr_controls_fdr()
+    print("All engine tests passed.")
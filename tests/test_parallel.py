@@ -0,0 +1,200 @@
+"""
+test_parallel.py
+Tests for the parallel execution layer: every backend must
+return exactly the replicates the serial loop returns.
+
+Author: Dili K. Maduabum
+Last edit: November 2025
+"""
+
+import os, sys
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+import subprocess
+import tempfile
+import numpy as np
+import pandas as pd
+from optimized.parallel_simulation import (
+    _iter_condition, predict_runtimes, select_backend
+)
+from optimized.kernels import COUNT_COLUMNS, COUNT_DTYPE, read_counts_csv
+from optimized.sharding import merge_shards, shard_range
+from optimized.simulation_opt import run_simulation_opt
+
+
+def test_backends_match_serial():
+    """
+    Threads and processes only change where replicates run,
+    so their output must equal the serial output row for row.
+    """
+    args = (200, 0.8, 2.5, 0.05, 2000, 1, list(range(40)))
+
+    def run(*backend):
+        return pd.DataFrame([res for batch in _iter_condition(*args, *backend)
+                             for res in batch])
+
+    serial = run(1, "serial", None)
+    threads = run(2, "threads", 7)
+    procs = run(2, "processes", 11)
+
+    pd.testing.assert_frame_equal(serial, threads)
+    pd.testing.assert_frame_equal(serial, procs)
+
+
+def test_auto_selection_follows_cost_model():
+    """
+    With a fixed calibration, small problems stay serial and
+    large-m problems go to threads; -1 cores means all of them.
+    """
+    calibration = {
+        "rep_fixed": 8e-5,
+        "rep_per_m": 5e-8,
+        "thread_start": 0.01,
+        "process_start": 1.0,
+        "process_task": 0.005,
+    }
+
+    assert select_backend(100, 1000, 1) == "serial"
+    assert select_backend(10, 100, 4, calibration) == "serial"
+    assert select_backend(100000, 1000, 4, calibration) == "threads"
+
+    predicted = predict_runtimes(100000, 1000, 4, calibration)
+    assert predicted["threads"] < predicted["serial"]
+
+    # -1 means all cores, as in joblib, not "serial"
+    from joblib import effective_n_jobs
+    all_cores = effective_n_jobs(-1)
+    assert (select_backend(100000, 1000, -1, calibration)
+            == select_backend(100000, 1000, all_cores, calibration))
+
+
+def test_shard_ranges_partition_tasks():
+    """
+    Shard blocks are disjoint and cover the task space in order,
+    including when there are more shards than tasks.
+    """
+    for n_tasks, count in [(30, 4), (7, 7), (3, 5)]:
+        covered = [t for i in range(count)
+                   for t in shard_range(n_tasks, (i, count))]
+        assert covered == list(range(n_tasks))
+
+
+def test_merged_shards_equal_single_node():
+    """
+    Running N shards and merging them reproduces the
+    single-node result file exactly.
+    """
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            single = run_simulation_opt(nsim=10)
+            for i in range(4):
+                run_simulation_opt(nsim=10, shard=(i, 4))
+            merged = merge_shards("results/raw/simulation_opt.csv", 4)
+            on_disk = read_counts_csv("results/raw/simulation_opt.csv")
+        finally:
+            os.chdir(cwd)
+
+    pd.testing.assert_frame_equal(single, merged)
+    pd.testing.assert_frame_equal(merged, on_disk)
+
+
+def test_pipeline_writes_batches_in_order():
+    """
+    Writing batches on the writer thread through a small bounded
+    queue gives the same file as building the whole DataFrame first.
+    """
+    from optimized.kernels import run_batch_opt
+    from optimized.pipeline import iter_tasks, run_pipeline
+
+    conditions = [(100, 0.8, 2.5), (300, 0.7, 2.0)]
+    expected = pd.DataFrame(
+        [res for c, (m, pi0, eff) in enumerate(conditions)
+         for res in run_batch_opt(m, pi0, eff, 0.05, 5, c, range(23))]
+    ).astype({c: COUNT_DTYPE for c in COUNT_COLUMNS})
+
+    batches = (run_batch_opt(m, pi0, eff, 0.05, 5, c, reps)
+               for c, (m, pi0, eff), reps in iter_tasks(conditions, 23, 5))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "out.csv")
+        n = run_pipeline(batches, path, maxsize=1)
+        df = read_counts_csv(path)
+
+    assert n == len(expected)
+    pd.testing.assert_frame_equal(df, expected)
+
+
+def test_pipeline_raises_writer_errors():
+    """
+    A failure in the writer thread reaches the caller and stops
+    the producer early instead of running the rest of the sweep.
+    """
+    from optimized.pipeline import run_pipeline
+
+    produced = []
+
+    def batches():
+        for i in range(100):
+            produced.append(i)
+            yield [{"a": i}]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        try:
+            run_pipeline(batches(), tmp, maxsize=1)   # a directory: open fails
+        except OSError:
+            pass
+        else:
+            raise AssertionError("writer error was not raised")
+
+    # At most the queued batch, the one blocked on put() and one more
+    assert len(produced) <= 3
+
+
+def test_kernels_import_is_lean():
+    """
+    A fresh worker importing the kernels must not load pandas.
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    code = "import sys, optimized.kernels; print('pandas' in sys.modules)"
+    out = subprocess.run([sys.executable, "-c", code], cwd=root,
+                         capture_output=True, text=True, check=True)
+    assert out.stdout.strip() == "False"
+
+
+def test_streams_are_chunk_invariant():
+    """
+    A replicate's result depends only on (seed, condition, rep):
+    running it alone or inside any batch gives the same numbers.
+    """
+    from optimized.kernels import (
+        generate_pvalues_vectorized, replicate_seed, run_batch_opt
+    )
+
+    reps = list(range(25))
+    whole = run_batch_opt(300, 0.8, 2.5, 0.05, 7, 3, reps)
+    pieces = [res for lo in range(0, 25, 4)
+              for res in run_batch_opt(300, 0.8, 2.5, 0.05, 7, 3,
+                                       reps[lo:lo + 4])]
+    alone = run_batch_opt(300, 0.8, 2.5, 0.05, 7, 3, [24])
+
+    assert whole == pieces
+    assert alone[0] == whole[24]
+
+    # Neighbouring conditions get unrelated streams
+    p3, _ = generate_pvalues_vectorized(300, 0.8, 2.5, replicate_seed(7, 3, 24))
+    p4, _ = generate_pvalues_vectorized(300, 0.8, 2.5, replicate_seed(7, 4, 24))
+    assert not np.any(p3 == p4)
+
+
+if __name__ == "__main__":
+    test_backends_match_serial()
+    test_auto_selection_follows_cost_model()
+    test_shard_ranges_partition_tasks()
+    test_merged_shards_equal_single_node()
+    test_pipeline_writes_batches_in_order()
+    test_pipeline_raises_writer_errors()
+    test_kernels_import_is_lean()
+    test_streams_are_chunk_invariant()
+    print("All parallel tests passed.")
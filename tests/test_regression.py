@@ -11,6 +11,7 @@ import os, sys
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 
 import numpy as np
+from baseline.metrics import fdr_from_counts, power_from_counts
 from baseline.simulation import run_single_simulation
 from optimized.simulation_opt import run_single_sim_opt
 
@@ -30,13 +31,12 @@ def test_single_replicate_equivalence():
     base = run_single_simulation(m, pi0, eff, alpha, seed)
     opt  = run_single_sim_opt(m, pi0, eff, alpha, seed)
 
-    # Extract BH results from baseline (Unit 2)
-    base_fdr = float(base["BH"]["FDR"])
-    base_tpr = float(base["BH"]["Power"])
+    # Both versions store counts; derive FDR and TPR from them
+    base_fdr = float(fdr_from_counts(base["BH"]["V"], base["BH"]["R"]))
+    base_tpr = float(power_from_counts(base["BH"]["S"], base["BH"]["m1"]))
 
-    # Extract optimized values
-    opt_fdr = opt["fdr"]
-    opt_tpr = opt["tpr"]
+    opt_fdr = float(fdr_from_counts(opt["V"], opt["R"]))
+    opt_tpr = float(power_from_counts(opt["S"], opt["m1"]))
 
     # Compare within reasonable tolerance
     assert abs(base_fdr - opt_fdr) < 0.10
@@ -70,9 +70,153 @@ def test_pvalue_distribution_match():
     assert p < 0.001
 
 
+def test_ttest_dgp_equivalence():
+    """
+    The chunked moment-based t-test kernel reproduces scipy's
+    ttest_ind p-values from the baseline DGP on the same draws,
+    for both Welch and Student tests and any chunk size; both
+    reject n < 2.
+    """
+    import baseline.dgps as dgps
+    import optimized.kernels as kernels
+
+    m, pi0, eff, n, seed = 300, 0.7, 0.8, 12, 7
+
+    for test in ("welch", "student"):
+        base = dgps.generate_pvalues_ttest(m, pi0, eff, n, test,
+                                           sd_ratio=1.5, seed=seed)
+        opt, is_null = kernels.generate_pvalues_ttest_vectorized(
+            m, pi0, eff, n, test, sd_ratio=1.5, seed=seed)
+
+        # Same draws; the baseline only shuffles the order
+        assert np.allclose(np.sort(opt), np.sort(base["p_value"]),
+                           rtol=1e-10, atol=0)
+        assert is_null.sum() == base["is_null"].sum()
+
+        # Blocks smaller than one row still give the same data
+        chunk = kernels.CHUNK_ELEMENTS
+        try:
+            kernels.CHUNK_ELEMENTS = 5
+            small, _ = kernels.generate_pvalues_ttest_vectorized(
+                m, pi0, eff, n, test, sd_ratio=1.5, seed=seed)
+        finally:
+            kernels.CHUNK_ELEMENTS = chunk
+        assert np.allclose(small, opt, rtol=1e-10, atol=0)
+
+    # One observation per group has no sample variance
+    for generate in (dgps.generate_pvalues_ttest,
+                     kernels.generate_pvalues_ttest_vectorized):
+        try:
+            generate(m, pi0, eff, 1, "welch", seed=seed)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("n = 1 was accepted")
+
+
+def test_permutation_dgp_matches_loop():
+    """
+    The gathered, blocked permutation kernel gives the p-values of
+    a plain per-test, per-permutation loop over the same draws, for
+    any block size, and null p-values are roughly uniform.
+    """
+    import optimized.kernels as kernels
+
+    m, pi0, eff, n, n_perm, seed = 40, 0.5, 1.5, 6, 199, 11
+    fast, is_null = kernels.generate_pvalues_permutation_vectorized(
+        m, pi0, eff, n, n_perm, seed=seed)
+
+    # Same stream: permutations first, then the data row by row
+    rng = kernels.make_rng(seed)
+    labels = rng.permuted(np.tile(np.arange(2 * n), (n_perm, 1)), axis=1)
+    x = rng.standard_normal((m, 2 * n))
+    x[~is_null, n:] += eff
+
+    for i in range(m):
+        observed = abs(x[i, n:].mean() - x[i, :n].mean())
+        exceed = sum(
+            abs(x[i, perm[:n]].mean() - x[i, perm[n:]].mean())
+            >= observed - 1e-12
+            for perm in labels
+        )
+        assert fast[i] == (1 + exceed) / (n_perm + 1)
+
+    chunk = kernels.CHUNK_ELEMENTS
+    try:
+        kernels.CHUNK_ELEMENTS = 50   # 8 permutations x 1 row per block
+        small, _ = kernels.generate_pvalues_permutation_vectorized(
+            m, pi0, eff, n, n_perm, seed=seed)
+    finally:
+        kernels.CHUNK_ELEMENTS = chunk
+    assert np.array_equal(small, fast)
+
+    null, _ = kernels.generate_pvalues_permutation_vectorized(
+        2000, 1.0, 0.0, 10, 99, seed=3)
+    assert abs(np.mean(null <= 0.05) - 0.05) < 0.02
+
+
+def test_counts_reaggregate_on_load():
+    """
+    Drivers store integer counts; loading derives the per-replicate
+    ratios and pooled metrics such as E[V] / E[R] from them.
+    """
+    import tempfile
+    from baseline.metrics import load_results, pooled_metrics
+    from optimized.simulation_opt import run_simulation_opt
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            run_simulation_opt(nsim=20)
+            df = load_results("results/raw/simulation_opt.csv")
+        finally:
+            os.chdir(cwd)
+
+    assert str(df["R"].dtype) == "uint32"
+    assert np.allclose(df["FDR"], fdr_from_counts(df["V"], df["R"]))
+    assert np.allclose(df["Power"], df["S"] / df["m1"])
+
+    pooled = pooled_metrics(df, "m")
+    sub = df[df["m"] == 100]
+    assert np.isclose(pooled["mFDR"].iloc[0], sub["V"].sum() / sub["R"].sum())
+
+
+
+def test_count_schema_layering():
+    """
+    The baseline owns the count schema and imports nothing from
+    optimized/; the kernels' standalone copy of it agrees.
+    """
+    import subprocess
+    import baseline.metrics as metrics
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = {k: v for k, v in os.environ.items() if k != "PYTHONPATH"}
+
+    code = ("import sys, baseline.metrics; "
+            "print(any(m.startswith('optimized') for m in sys.modules))")
+    out = subprocess.run([sys.executable, "-c", code], cwd=root, env=env,
+                         capture_output=True, text=True, check=True)
+    assert out.stdout.strip() == "False"
+
+    # As in "python optimized/<script>.py": baseline is not importable
+    code = ("import sys; sys.path[:0] = ['optimized']; import kernels; "
+            "print((kernels.COUNT_COLUMNS, kernels.COUNT_DTYPE, "
+            "kernels.BOUND_COLUMNS, kernels.read_counts_csv.__module__))")
+    out = subprocess.run([sys.executable, "-I", "-c", code], cwd=root,
+                         capture_output=True, text=True, check=True)
+    expected = (metrics.COUNT_COLUMNS, metrics.COUNT_DTYPE,
+                metrics.BOUND_COLUMNS, "kernels")
+    assert out.stdout.strip() == repr(expected)
+
 
 if __name__ == "__main__":
     test_single_replicate_equivalence()
     test_pvalue_distribution_match()
+    test_ttest_dgp_equivalence()
+    test_permutation_dgp_matches_loop()
+    test_counts_reaggregate_on_load()
+    test_count_schema_layering()
     print("All regression tests passed.")
 